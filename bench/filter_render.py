@@ -0,0 +1,144 @@
+"""
+Benchmark: rendering filter replies
+
+Rebuilds the chain filter replies used to go through on every hit
+(random option -> fillings -> button extraction, all on the raw text) and
+checks that FilterReply.render gives the same text and keyboard, apart
+from the intended difference: {mention} stays inline text instead of
+being turned into a tg:// button.
+
+Then times both over a stream of rendered hits.
+
+Usage (from the repository root):
+    python -m bench.filter_render [--hits 100000] [--repeat 5]
+"""
+
+import argparse
+import random
+import timeit
+from types import SimpleNamespace
+
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+from bot.utils.filter_reply import FilterReply
+from bot.utils.helpers import build_keyboard, parse_buttons_raw
+from bot.utils.markdown import escape_markdown
+
+USER = SimpleNamespace(id=42, first_name="Ali_x", last_name="Veli", username="ali")
+CHAT = SimpleNamespace(id=-100, title="Test Grubu")
+
+# Filter responses without {mention}, rendered the same by both chains
+RESPONSES = [
+    "Merhaba!",
+    "Selam {first}, {chatname} grubuna hos geldin",
+    "{fullname} ({username}) id: {id}",
+    "Gunaydin %%% Iyi aksamlar {first} %%% Naber {last}?",
+    "Sitemiz [Site](https://example.com)",
+    "Linkler:\n[A](https://a.example) [B](https://b.example:same)\n[C](buttonurl://c.example)",
+    "{first} icin [Profil](https://x.com/{username}) %%% [Hi {first}](https://a.b) %%% Yok",
+    "[{chatname} kurallari](https://example.com/rules?chat={id})",
+]
+
+
+# ==================== OLD CHAIN ====================
+
+def old_apply_fillings(text: str, user, chat=None) -> str:
+    first_name = user.first_name or "Kullanici"
+    last_name = user.last_name or ""
+    replacements = {
+        '{first}': first_name,
+        '{last}': last_name,
+        '{fullname}': f"{first_name} {last_name}".strip(),
+        '{username}': f"@{user.username}" if user.username else first_name,
+        '{mention}': f"[{escape_markdown(first_name)}](tg://user?id={user.id})",
+        '{id}': str(user.id),
+        '{chatname}': chat.title if chat else "Grup",
+    }
+    for key, value in replacements.items():
+        text = text.replace(key, value)
+    return text
+
+
+def old_parse_random_content(text: str) -> str:
+    if not text or '%%%' not in text:
+        return text
+    options = [opt.strip() for opt in text.split('%%%') if opt.strip()]
+    return random.choice(options) if options else text
+
+
+def old_process_filter_response(text: str, user, chat=None) -> tuple:
+    """random -> fillings -> buttons, as before the compiled templates"""
+    if not text:
+        return "", None
+    text = old_parse_random_content(text)
+    text = old_apply_fillings(text, user, chat)
+    cleaned, buttons = parse_buttons_raw(text)
+    if buttons:
+        return cleaned.strip(), build_keyboard(buttons)
+    return text.strip(), None
+
+
+# ==================== CHECKS ====================
+
+def new_render(text: str, user, chat=None, buttons=None) -> tuple:
+    response, _, keyboard = FilterReply.from_filter({'response': text, 'buttons': buttons}).render(user, chat)
+    return response, keyboard
+
+
+def check():
+    """Compare both chains; raises AssertionError on a difference"""
+    for text in RESPONSES:
+        for seed in range(10):
+            random.seed(seed)
+            old = old_process_filter_response(text, USER, CHAT)
+            random.seed(seed)
+            new = new_render(text, USER, CHAT)
+            assert old == new, (text, old, new)
+
+    # Fillings in button labels and URLs are filled on every hit
+    _, keyboard = new_render("[Hi {first}](https://a.b) [Profil](https://x.com/{username}:same)", USER, CHAT)
+    assert keyboard == InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text="Hi Ali_x", url="https://a.b"),
+        InlineKeyboardButton(text="Profil", url="https://x.com/@ali"),
+    ]])
+
+    # ... also in stored buttons, which take precedence over the text's
+    stored = [[{'text': "Hi {first}", 'url': "https://a.b"}]]
+    _, keyboard = new_render("[Hi {first}](https://a.b)", USER, CHAT, buttons=stored)
+    assert keyboard.inline_keyboard[0][0].text == "Hi Ali_x"
+
+    # Buttons without fillings keep one prebuilt markup
+    reply = FilterReply.from_filter({'response': "[Site](https://example.com)"})
+    assert reply.render(USER)[2] is reply.render(USER)[2]
+
+    # {mention} stays inline text (the old chain turned it into a button)
+    text, keyboard = new_render("Selam {mention} [Site](https://example.com)", USER, CHAT)
+    assert text == "Selam [Ali\\_x](tg://user?id=42)"
+    assert [button.text for button in keyboard.inline_keyboard[0]] == ["Site"]
+
+
+def best_of(func, hits: list, repeat: int) -> float:
+    return min(timeit.repeat(lambda: [func(*hit) for hit in hits], number=1, repeat=repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--hits", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    check()
+
+    # Filters are loaded once and hit many times - compile outside the timed loop
+    replies = {text: FilterReply.from_filter({'response': text}) for text in RESPONSES}
+    rng = random.Random(42)
+    hits = [(rng.choice(RESPONSES), USER, CHAT) for _ in range(args.hits)]
+
+    old_time = best_of(old_process_filter_response, hits, args.repeat)
+    new_time = best_of(lambda text, user, chat: replies[text].render(user, chat), hits, args.repeat)
+    print(f"{args.hits} hits, best of {args.repeat}")
+    print(f"  old chain {old_time:.3f}s  FilterReply.render {new_time:.3f}s  ({old_time / new_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
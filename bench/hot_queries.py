@@ -0,0 +1,141 @@
+"""
+Benchmark: hot queries by name vs. raw SQL helpers
+
+For every statement in the registry (bot/database/connection.py), times
+the same call three ways:
+
+- unprepared: a connection without statement cache, rows copied to dicts
+  (every call parses and plans the query again)
+- text + dict: fetch_all / fetch_one / execute with the SQL text, rows
+  copied to dicts - how the DAO modules called these queries before
+- named: fetch_named / fetchrow_named / execute_named, asyncpg Records
+
+Needs DATABASE_URL; runs in a temporary schema (see bench/scratch_db.py)
+seeded with one chat of realistic size.
+
+Usage (from the repository root):
+    python -m bench.hot_queries [--calls 2000] [--members 5000] [--filters 50]
+"""
+
+import argparse
+import asyncio
+import time
+
+import asyncpg
+
+from bot.config import DATABASE_URL
+from bot.database.connection import (
+    STATEMENTS, fetch_all, fetch_one, execute, fetch_named, fetchrow_named, execute_named
+)
+from bot.database.filters import add_filter, FILTERS_BY_CHAT
+from bot.database.members import save_members_bulk, MEMBERS_PAGE, UPSERT_MEMBERS
+from bot.database.settings import (
+    set_welcome_message, start_tag_session, connect_user_to_chat,
+    SETTINGS_BY_CHAT, UPDATE_TAG_INDEX, CONNECTION_BY_USER, TAG_LEASE_SECONDS
+)
+from bench.scratch_db import scratch_database
+
+CHAT_ID = -1001234567890
+USER_ID = 123456789
+OWNER = "bench"
+
+
+async def seed(members: int, filters: int) -> int:
+    """Fill the scratch schema with one chat, returns the tag session's run_id"""
+    await save_members_bulk(CHAT_ID, [
+        {'user_id': 700000 + i, 'username': f"user_{i}", 'first_name': f"Uye {i}"}
+        for i in range(members)
+    ])
+    for i in range(filters):
+        await add_filter(
+            CHAT_ID, f"kelime{i}", f"Cevap {i} {{first}} %%% Diger cevap {i}",
+            buttons=[[{'text': "Site", 'url': "https://example.com"}]]
+        )
+    await set_welcome_message(CHAT_ID, "Hos geldin {mention}!")
+    await connect_user_to_chat(USER_ID, CHAT_ID, "Bench")
+    return await start_tag_session(CHAT_ID, "Etiket", USER_ID, OWNER)
+
+
+def query_args(run_id: int) -> dict:
+    """Statement name -> (kind, args) of a typical call"""
+    return {
+        FILTERS_BY_CHAT: ("fetch", (CHAT_ID,)),
+        MEMBERS_PAGE: ("fetch", (CHAT_ID, 0, 500)),
+        SETTINGS_BY_CHAT: ("fetchrow", (CHAT_ID,)),
+        CONNECTION_BY_USER: ("fetchrow", (USER_ID,)),
+        UPDATE_TAG_INDEX: ("execute", (5, 700005, CHAT_ID, run_id, OWNER, TAG_LEASE_SECONDS)),
+        UPSERT_MEMBERS: ("execute", (
+            [CHAT_ID] * 5, [800000 + i for i in range(5)],
+            [f"new_{i}" for i in range(5)], [f"Yeni {i}" for i in range(5)]
+        )),
+    }
+
+
+async def time_calls(calls: int, call) -> float:
+    started = time.perf_counter()
+    for _ in range(calls):
+        await call()
+    return (time.perf_counter() - started) / calls
+
+
+async def run(calls: int, members: int, filters: int):
+    async with scratch_database() as schema:
+        run_id = await seed(members, filters)
+        unprepared = await asyncpg.connect(
+            DATABASE_URL, statement_cache_size=0, server_settings={'search_path': schema}
+        )
+        try:
+            print(f"{calls} calls per variant, average per call")
+            for name, (kind, args) in query_args(run_id).items():
+                sql = STATEMENTS[name]
+                if kind == "fetch":
+                    variants = (
+                        lambda: _dicts(unprepared.fetch(sql, *args)),
+                        lambda: fetch_all(sql, *args),
+                        lambda: fetch_named(name, *args),
+                    )
+                elif kind == "fetchrow":
+                    variants = (
+                        lambda: _dict(unprepared.fetchrow(sql, *args)),
+                        lambda: fetch_one(sql, *args),
+                        lambda: fetchrow_named(name, *args),
+                    )
+                else:
+                    variants = (
+                        lambda: unprepared.execute(sql, *args),
+                        lambda: execute(sql, *args),
+                        lambda: execute_named(name, *args),
+                    )
+
+                timings = []
+                for variant in variants:
+                    await variant()  # warm up (prepares the statement once)
+                    timings.append(await time_calls(calls, variant) * 1000)
+                print(
+                    f"  {name:22} unprepared {timings[0]:7.3f}ms  "
+                    f"text + dict {timings[1]:7.3f}ms  named {timings[2]:7.3f}ms"
+                )
+        finally:
+            await unprepared.close()
+
+
+async def _dicts(rows_coro) -> list:
+    return [dict(row) for row in await rows_coro]
+
+
+async def _dict(row_coro):
+    row = await row_coro
+    return dict(row) if row else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--members", type=int, default=5000)
+    parser.add_argument("--filters", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.calls, args.members, args.filters))
+
+
+if __name__ == "__main__":
+    main()
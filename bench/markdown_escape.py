@@ -0,0 +1,98 @@
+"""
+Benchmark: Markdown escaping of member mentions
+
+Compares the replace-chain escaping the bot used before bot/utils/markdown.py
+with the translate-table escapers, over a mention stream shaped like a
+/herkes run: mostly plain names, some with Markdown characters, emoji,
+non-Latin scripts, and members without a first name.
+
+Usage (from the repository root):
+    python -m bench.markdown_escape [--mentions 100000] [--repeat 5]
+"""
+
+import argparse
+import random
+import timeit
+
+from bot.utils.helpers import get_user_mention
+from bot.utils.markdown import escape_markdown
+
+MARKDOWN_V2_CHARS = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
+MARKDOWN_CHARS = ['_', '*', '[', ']', '(', ')', '~', '`']
+
+PLAIN_NAMES = ["Ahmet", "Mehmet Ali", "Ayse", "Fatma", "Can", "Elif", "Burak", "Zeynep", "John", "Maria"]
+MARKUP_NAMES = ["[VIP] Ayse", "Ali (admin)", "*Star*", "x_X_x", "Dr. Emre", "Selin!", "a-b=c", "~Deniz~", "#1 fan"]
+EMOJI_NAMES = ["Ece 🌸", "🔥Kaan🔥", "Mert ⚽", "😎", "Nur ✨✨"]
+SCRIPT_NAMES = ["Дмитрий", "Олена", "محمد", "فاطمة", "Γιώργος", "李雷"]
+USERNAMES = ["john_doe", "ayse.k", "user_12345", "the_real_can", None]
+
+
+def replace_chain_mention(user_id: int, username: str = None, first_name: str = None) -> str:
+    """get_user_mention as it was before the translate tables (18 str.replace calls)"""
+    if first_name and first_name.strip():
+        name = first_name.strip()
+    elif username:
+        name = username
+    else:
+        name = "Üye"
+
+    name = name.replace('\\', '\\\\')
+    for char in MARKDOWN_V2_CHARS:
+        name = name.replace(char, f'\\{char}')
+    return f"[{name}](tg://user?id={user_id})"
+
+
+def replace_chain_escape_markdown(text: str) -> str:
+    if not text:
+        return text
+    for char in MARKDOWN_CHARS:
+        text = text.replace(char, f'\\{char}')
+    return text
+
+
+def mention_stream(size: int, seed: int = 42) -> list:
+    """(user_id, username, first_name) rows with a realistic mix of names"""
+    rng = random.Random(seed)
+    pools = [
+        (0.62, PLAIN_NAMES),
+        (0.12, MARKUP_NAMES),
+        (0.10, EMOJI_NAMES),
+        (0.10, SCRIPT_NAMES),
+        (0.06, [None, "", "  "]),
+    ]
+    weights = [weight for weight, _ in pools]
+    rows = []
+    for i in range(size):
+        _, names = rng.choices(pools, weights)[0]
+        rows.append((100000 + i, rng.choice(USERNAMES), rng.choice(names)))
+    return rows
+
+
+def best_of(func, rows: list, repeat: int) -> float:
+    return min(timeit.repeat(lambda: [func(*row) for row in rows], number=1, repeat=repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mentions", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = mention_stream(args.mentions)
+    assert [replace_chain_mention(*row) for row in rows] == [get_user_mention(*row) for row in rows]
+
+    names = [(row[2] or "",) for row in rows]
+    assert [replace_chain_escape_markdown(*n) for n in names] == [escape_markdown(*n) for n in names]
+
+    print(f"{args.mentions} mentions, best of {args.repeat}")
+    for label, old, new, data in (
+        ("get_user_mention (MarkdownV2)", replace_chain_mention, get_user_mention, rows),
+        ("escape_markdown (legacy)", replace_chain_escape_markdown, escape_markdown, names),
+    ):
+        old_time = best_of(old, data, args.repeat)
+        new_time = best_of(new, data, args.repeat)
+        print(f"  {label:32} replace chain {old_time:.3f}s  translate {new_time:.3f}s  ({old_time / new_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
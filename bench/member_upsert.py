@@ -0,0 +1,76 @@
+"""
+Benchmark: bulk member ingestion
+
+Compares save_members_bulk with the row-by-row loop it replaced (one
+INSERT ... ON CONFLICT round trip per member, no transaction) when saving
+a whole member list: first into an empty chat, then again with every name
+changed.
+
+Needs DATABASE_URL; runs in a temporary schema (see bench/scratch_db.py).
+The old loop pays one network round trip per row, so 100k rows can take
+minutes against a remote database.
+
+Usage (from the repository root):
+    python -m bench.member_upsert [--sizes 10000,100000]
+"""
+
+import argparse
+import asyncio
+import time
+
+from bot.database.connection import acquire
+from bot.database.members import save_members_bulk, get_members_count
+from bench.scratch_db import scratch_database
+
+UPSERT_ONE = """
+    INSERT INTO members (chat_id, user_id, username, first_name)
+    VALUES ($1, $2, $3, $4)
+    ON CONFLICT (chat_id, user_id)
+    DO UPDATE SET username = EXCLUDED.username, first_name = EXCLUDED.first_name
+"""
+
+
+async def save_members_loop(chat_id: int, members: list):
+    """save_members_bulk as it was before the set-based upsert"""
+    async with acquire() as conn:
+        for member in members:
+            await conn.execute(
+                UPSERT_ONE, chat_id, member['user_id'], member.get('username'), member.get('first_name')
+            )
+
+
+def make_members(size: int, suffix: str) -> list:
+    return [
+        {'user_id': 500000 + i, 'username': f"user_{i}", 'first_name': f"Uye {i} {suffix}"}
+        for i in range(size)
+    ]
+
+
+async def timed(coro) -> float:
+    started = time.perf_counter()
+    await coro
+    return time.perf_counter() - started
+
+
+async def run(sizes: list):
+    async with scratch_database() as schema:
+        print(f"schema {schema}")
+        chat_id = -1000000000000
+        for size in sizes:
+            for label, save in (("loop", save_members_loop), ("bulk", save_members_bulk)):
+                chat_id -= 1
+                insert = await timed(save(chat_id, make_members(size, "a")))
+                update = await timed(save(chat_id, make_members(size, "b")))
+                assert await get_members_count(chat_id) == size
+                print(f"  {size:>7} rows  {label}: insert {insert:8.2f}s  update {update:8.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="10000,100000")
+    args = parser.parse_args()
+    asyncio.run(run([int(size) for size in args.sizes.split(",")]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+Throwaway database for the benchmarks
+
+Creates a schema named bench_<pid> in the DATABASE_URL database, points the
+bot's pool at it (init_db then applies the migrations there, exactly as on
+a real start) and drops the schema again afterwards. Nothing outside that
+schema is touched.
+"""
+
+import os
+import sys
+from contextlib import asynccontextmanager
+
+import asyncpg
+
+from bot.config import DATABASE_URL
+from bot.database import connection
+
+
+@asynccontextmanager
+async def scratch_database():
+    """Run the body against a freshly migrated, temporary schema"""
+    if not DATABASE_URL:
+        sys.exit("DATABASE_URL is not set (.env or environment)")
+
+    schema = f"bench_{os.getpid()}"
+    admin = await asyncpg.connect(DATABASE_URL)
+    await admin.execute(f'CREATE SCHEMA "{schema}"')
+    connection.DB_SEARCH_PATH = schema
+    try:
+        await connection.init_db()
+        yield schema
+    finally:
+        await connection.close_db()
+        await admin.execute(f'DROP SCHEMA "{schema}" CASCADE')
+        await admin.close()
@@ -1,17 +1,32 @@
 import asyncio
 import logging
+import re
+import signal
+from aiohttp import web
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 
-from bot.config import BOT_TOKEN, BOT_NAME
-from bot.database.connection import init_db, close_db
+from bot.config import (
+    BOT_TOKEN, BOT_NAME, RUN_MODE,
+    UPDATE_WORKERS, UPDATE_CHAT_QUEUE_LIMIT, UPDATE_QUEUE_LIMIT, UPDATE_DRAIN_TIMEOUT, MULTI_INSTANCE,
+    WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBAPP_HOST, WEBAPP_PORT
+)
+from bot.database.connection import init_db, close_db, run_db_health_probe, run_listener
+from bot.database.invalidation import CACHE_CHANNEL, on_invalidation, clear_caches
+from bot.database.settings import TAG_STOP_CHANNEL
+from bot.database.members import run_member_flusher, stop_member_flusher
+from bot.utils.rate_limiter import RateLimitMiddleware
+from bot.utils.helpers import register_bot_commands, allowed_chats_middleware
+from bot.utils.update_executor import UpdateExecutor
+from bot.utils.admin_roster import run_roster_refresher
 
 # Import all routers
 from bot.handlers.basic import router as basic_router
 from bot.handlers.admin import router as admin_router
 from bot.handlers.filters import router as filters_router
-from bot.handlers.tagger import router as tagger_router
+from bot.handlers.tagger import router as tagger_router, run_tag_scheduler, on_tag_stop_notify
 from bot.handlers.command_guard import router as guard_router
 
 # Configure logging
@@ -22,6 +37,48 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+async def run_webhook(bot: Bot, dp: Dispatcher):
+    """Serve updates over an aiohttp webhook until SIGINT/SIGTERM"""
+    app = web.Application()
+
+    # Requests without the matching X-Telegram-Bot-Api-Secret-Token header are rejected
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=WEBHOOK_SECRET
+    ).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, WEBAPP_HOST, WEBAPP_PORT)
+    await site.start()
+    logger.info(f"Webhook dinleniyor: {WEBAPP_HOST}:{WEBAPP_PORT}{WEBHOOK_PATH}")
+
+    if WEBHOOK_URL:
+        await bot.set_webhook(
+            f"{WEBHOOK_URL}{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=dp.resolve_used_update_types()
+        )
+    else:
+        logger.warning("WEBHOOK_URL bos - webhook Telegram'a kaydedilmedi (lokal test modu)")
+
+    # Wait for a stop signal, then let in-flight requests finish
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            pass  # Windows
+
+    try:
+        await stop_event.wait()
+    finally:
+        # The webhook stays registered so other replicas keep receiving updates
+        await runner.cleanup()
+
 
 async def main():
     """Main function to start the bot"""
@@ -30,6 +87,14 @@ async def main():
         logger.error("BOT_TOKEN bulunamadi! .env dosyasini kontrol edin.")
         return
 
+    # Without the secret anyone reaching the endpoint could post forged updates
+    if RUN_MODE == "webhook" and not re.fullmatch(r'[A-Za-z0-9_-]{1,256}', WEBHOOK_SECRET):
+        logger.error(
+            "Webhook modu icin gecerli bir WEBHOOK_SECRET gerekli "
+            "(1-256 karakter, sadece A-Z a-z 0-9 _ -). .env dosyasini kontrol edin."
+        )
+        return
+
     # Initialize database
     await init_db()
 
@@ -38,8 +103,21 @@ async def main():
         token=BOT_TOKEN,
         default=DefaultBotProperties(parse_mode=ParseMode.MARKDOWN)
     )
+    # Every outgoing API call goes through the rate limiter (pacing + flood-wait retries)
+    bot.session.middleware(RateLimitMiddleware())
     dp = Dispatcher()
 
+    # Updates from groups outside ALLOWED_GROUP_IDS are dropped before any router runs
+    dp.update.outer_middleware(allowed_chats_middleware)
+
+    # Remaining updates run on a bounded worker pool, in order within each chat
+    update_executor = UpdateExecutor(
+        workers=UPDATE_WORKERS,
+        chat_queue_limit=UPDATE_CHAT_QUEUE_LIMIT,
+        max_pending=UPDATE_QUEUE_LIMIT
+    )
+    dp.update.outer_middleware(update_executor)
+
     # Register routers (order matters!)
     # 1. Basic router first - has middleware for deleting system messages
     # 2. Tagger router - has middleware for auto-saving members
@@ -52,14 +130,59 @@ async def main():
     dp.include_router(filters_router)
     dp.include_router(guard_router)
 
+    # Command set used by the command guard, taken from the routers' Command filters
+    register_bot_commands(dp)
+
     # Get bot info
     me = await bot.get_me()
     logger.info(f"Bot basladi: @{me.username} (ID: {me.id})")
 
+    # Background writer for members seen in group messages
+    member_flusher = asyncio.create_task(run_member_flusher())
+
+    # Tag sessions run here, outside the message handlers, and resume after restarts
+    tag_scheduler = asyncio.create_task(run_tag_scheduler(bot))
+
+    # Periodic pool ping + stats log
+    db_health = asyncio.create_task(run_db_health_probe())
+
+    # Scheduled reload of the per-chat admin rosters behind the permission checks
+    roster_refresher = asyncio.create_task(run_roster_refresher(bot))
+
+    # Replicas: /durdur and cache invalidations from the other processes.
+    # Reconnects on its own and drops the caches afterwards; a stop missed
+    # meanwhile is still noticed by the session's next progress write
+    notify_listener = None
+    if MULTI_INSTANCE:
+        notify_listener = asyncio.create_task(run_listener(
+            {TAG_STOP_CHANNEL: on_tag_stop_notify, CACHE_CHANNEL: on_invalidation},
+            on_reconnect=clear_caches
+        ))
+
+    update_executor.start()
+
     try:
-        await dp.start_polling(bot)
+        if RUN_MODE == "webhook":
+            await run_webhook(bot, dp)
+        else:
+            # Polling needs the webhook removed
+            await bot.delete_webhook()
+            # Updates are fed one by one; the executor does the concurrency
+            # and slows polling down when too many updates are waiting
+            await dp.start_polling(bot, handle_as_tasks=False)
     finally:
         logger.info("Bot kapatiliyor...")
+        # Updates already fetched are finished first, Telegram won't resend them
+        await update_executor.stop(timeout=UPDATE_DRAIN_TIMEOUT)
+        if notify_listener is not None:
+            notify_listener.cancel()
+        roster_refresher.cancel()
+        db_health.cancel()
+        # Awaited so it releases its tag session leases while the pool is open
+        tag_scheduler.cancel()
+        await asyncio.gather(tag_scheduler, return_exceptions=True)
+        # Buffered members are written before the pool closes
+        await stop_member_flusher(member_flusher)
         await close_db()
         await bot.session.close()
 
@@ -9,15 +9,74 @@ BOT_TOKEN = os.getenv("BOT_TOKEN", "")
 # Database - Using PostgreSQL (Neon.tech)
 DATABASE_URL = os.getenv("DATABASE_URL", "")
 
+
+def _env_number(name: str, default, cast=int):
+    """Read a numeric env var, falling back to default when missing or invalid"""
+    value = os.getenv(name, "").strip()
+    try:
+        return cast(value) if value else default
+    except ValueError:
+        return default
+
+
+# Database pool tuning
+DB_POOL_MIN_SIZE = _env_number("DB_POOL_MIN_SIZE", 1)
+DB_POOL_MAX_SIZE = _env_number("DB_POOL_MAX_SIZE", 10)
+DB_STATEMENT_CACHE_SIZE = _env_number("DB_STATEMENT_CACHE_SIZE", 100)
+# Close idle connections after this many seconds (Neon suspends idle computes anyway)
+DB_MAX_INACTIVE_LIFETIME = _env_number("DB_MAX_INACTIVE_LIFETIME", 300.0, float)
+# Seconds to wait for a new connection (cold starts can be slow) and for a query
+DB_CONNECT_TIMEOUT = _env_number("DB_CONNECT_TIMEOUT", 30.0, float)
+DB_COMMAND_TIMEOUT = _env_number("DB_COMMAND_TIMEOUT", 30.0, float)
+# Server-side statement_timeout in milliseconds (0 disables)
+DB_STATEMENT_TIMEOUT_MS = _env_number("DB_STATEMENT_TIMEOUT_MS", 15000)
+DB_SEARCH_PATH = os.getenv("DB_SEARCH_PATH", "public").strip() or "public"
+# Seconds between pool health probes (0 disables)
+DB_HEALTH_INTERVAL = _env_number("DB_HEALTH_INTERVAL", 60.0, float)
+
 # Log Channel (optional)
 _log_channel = os.getenv("LOG_CHANNEL_ID", "").strip()
 LOG_CHANNEL_ID = int(_log_channel) if _log_channel and _log_channel.lstrip('-').isdigit() else None
 
-# Allowed Group ID - Bot will ONLY work in this group
-# Set this to your group's chat ID (negative number for groups/supergroups)
-# Example: ALLOWED_GROUP_ID=-1001234567890
-_allowed_group = os.getenv("ALLOWED_GROUP_ID", "").strip()
-ALLOWED_GROUP_ID = int(_allowed_group) if _allowed_group and _allowed_group.lstrip('-').isdigit() else None
+# Allowed Group IDs - Bot will ONLY work in these groups (private chats always work)
+# Comma-separated chat IDs (negative numbers for groups/supergroups)
+# Example: ALLOWED_GROUP_IDS=-1001234567890,-1009876543210
+# The old single ALLOWED_GROUP_ID variable is still read when ALLOWED_GROUP_IDS is unset
+# Empty = no restriction
+_allowed_groups = os.getenv("ALLOWED_GROUP_IDS", "").strip() or os.getenv("ALLOWED_GROUP_ID", "").strip()
+ALLOWED_GROUP_IDS = frozenset(
+    int(part) for part in (p.strip() for p in _allowed_groups.split(",")) if part.lstrip('-').isdigit()
+)
+
+# Update executor: updates of one chat run in order, different chats in parallel
+UPDATE_WORKERS = _env_number("UPDATE_WORKERS", 16)
+# Waiting updates allowed per chat before new ones are dropped
+UPDATE_CHAT_QUEUE_LIMIT = _env_number("UPDATE_CHAT_QUEUE_LIMIT", 100)
+# Waiting updates in total before fetching new ones pauses
+UPDATE_QUEUE_LIMIT = _env_number("UPDATE_QUEUE_LIMIT", 1000)
+# Seconds to finish the waiting updates on shutdown before they are dropped
+UPDATE_DRAIN_TIMEOUT = _env_number("UPDATE_DRAIN_TIMEOUT", 20.0, float)
+
+# Run mode: "polling" (default) or "webhook"
+RUN_MODE = os.getenv("RUN_MODE", "polling").strip().lower()
+
+# Webhook settings (only used when RUN_MODE=webhook)
+# WEBHOOK_URL is the public base URL Telegram posts to, e.g. https://bot.example.com
+# Leave it empty to serve without registering the webhook (local testing)
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").strip().rstrip("/")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook").strip()
+# Required in webhook mode: Telegram sends it in every request and requests
+# without it are rejected. 1-256 characters, A-Z a-z 0-9 _ - only
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "").strip()
+WEBAPP_HOST = os.getenv("WEBAPP_HOST", "0.0.0.0").strip()
+_webapp_port = os.getenv("PORT", os.getenv("WEBAPP_PORT", "8080")).strip()
+WEBAPP_PORT = int(_webapp_port) if _webapp_port.isdigit() else 8080
+
+# Multi-instance deployments: replicas tell each other about /durdur and about
+# cached data they changed (filters, settings, connections, admin rosters)
+# over Postgres LISTEN/NOTIFY. The old TAG_STOP_NOTIFY variable is still read
+_multi_instance = os.getenv("MULTI_INSTANCE", "").strip() or os.getenv("TAG_STOP_NOTIFY", "").strip()
+MULTI_INSTANCE = _multi_instance.lower() in ("1", "true", "yes")
 
 # Bot settings
 BOT_NAME = "MsHarleyBot"
@@ -1,13 +1,86 @@
+import asyncio
+import json
+import logging
+import time
+from contextlib import asynccontextmanager
+
 import asyncpg
-from bot.config import DATABASE_URL
+from bot.config import (
+    DATABASE_URL, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_STATEMENT_CACHE_SIZE,
+    DB_MAX_INACTIVE_LIFETIME, DB_CONNECT_TIMEOUT, DB_COMMAND_TIMEOUT,
+    DB_STATEMENT_TIMEOUT_MS, DB_SEARCH_PATH, DB_HEALTH_INTERVAL
+)
+from bot.database.migrate import run_migrations
+
+logger = logging.getLogger(__name__)
 
 pool = None
 
+# Pool counters, see get_pool_stats()
+_stats = {
+    'acquire_count': 0,
+    'acquire_wait_total': 0.0,
+    'acquire_wait_max': 0.0,
+    'query_count': 0,
+    'query_errors': 0,
+    'query_time_total': 0.0,
+    'query_time_max': 0.0,
+    'health_failures': 0,
+}
+
+# Statement registry: name -> SQL of a hot query
+# asyncpg keeps prepared statements in a per-connection LRU cache keyed by
+# the exact SQL text (DB_STATEMENT_CACHE_SIZE entries). Calling hot queries
+# by name keeps their text identical across callers so they share one cache
+# entry; it can't guarantee a hit - with DB_STATEMENT_CACHE_SIZE=0 nothing
+# is cached, and an evicted statement is prepared again
+STATEMENTS: dict[str, str] = {}
+
+
+def register_statement(name: str, query: str) -> str:
+    """Register a hot query under a name, returns the name"""
+    STATEMENTS[name] = query
+    return name
+
+
+def _record_query(record):
+    """asyncpg query logger - accumulates query latency counters"""
+    _stats['query_count'] += 1
+    _stats['query_time_total'] += record.elapsed
+    if record.elapsed > _stats['query_time_max']:
+        _stats['query_time_max'] = record.elapsed
+    if record.exception is not None:
+        _stats['query_errors'] += 1
+
+
+async def _init_connection(conn):
+    """Per-connection setup hook, runs once for every new pool connection"""
+    # json/jsonb columns come back as Python objects and accept them as arguments
+    for type_name in ('json', 'jsonb'):
+        await conn.set_type_codec(
+            type_name, encoder=json.dumps, decoder=json.loads, schema='pg_catalog'
+        )
+    conn.add_query_logger(_record_query)
+
 
 async def init_db():
     """Initialize database connection pool"""
     global pool
-    pool = await asyncpg.create_pool(DATABASE_URL, min_size=1, max_size=10)
+    pool = await asyncpg.create_pool(
+        DATABASE_URL,
+        min_size=DB_POOL_MIN_SIZE,
+        max_size=DB_POOL_MAX_SIZE,
+        statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+        max_inactive_connection_lifetime=DB_MAX_INACTIVE_LIFETIME,
+        timeout=DB_CONNECT_TIMEOUT,
+        command_timeout=DB_COMMAND_TIMEOUT,
+        # Sent at connect time so they survive the RESET ALL done on release
+        server_settings={
+            'search_path': DB_SEARCH_PATH,
+            'statement_timeout': str(DB_STATEMENT_TIMEOUT_MS),
+        },
+        init=_init_connection
+    )
     await create_tables()
 
 
@@ -19,113 +92,167 @@ async def get_db():
     return pool
 
 
-async def fetch_one(query: str, *args):
-    """Fetch one row from database"""
+@asynccontextmanager
+async def acquire():
+    """Acquire a pool connection, recording how long the wait took"""
     db_pool = await get_db()
+    started = time.perf_counter()
     async with db_pool.acquire() as conn:
+        waited = time.perf_counter() - started
+        _stats['acquire_count'] += 1
+        _stats['acquire_wait_total'] += waited
+        if waited > _stats['acquire_wait_max']:
+            _stats['acquire_wait_max'] = waited
+        yield conn
+
+
+def get_pool_stats() -> dict:
+    """Snapshot of pool usage and query latency counters"""
+    stats = dict(_stats)
+    if pool is not None:
+        stats['size'] = pool.get_size()
+        stats['idle'] = pool.get_idle_size()
+        stats['in_use'] = stats['size'] - stats['idle']
+    acquires = stats['acquire_count'] or 1
+    queries = stats['query_count'] or 1
+    stats['acquire_wait_avg'] = stats['acquire_wait_total'] / acquires
+    stats['query_time_avg'] = stats['query_time_total'] / queries
+    return stats
+
+
+async def run_db_health_probe():
+    """Background task: ping the pool periodically and log its counters"""
+    if DB_HEALTH_INTERVAL <= 0:
+        return
+    while True:
+        await asyncio.sleep(DB_HEALTH_INTERVAL)
+        try:
+            async with acquire() as conn:
+                await conn.fetchval("SELECT 1", timeout=DB_CONNECT_TIMEOUT)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _stats['health_failures'] += 1
+            logger.warning(f"Veritabani saglik kontrolu basarisiz: {e}")
+            continue
+
+        stats = get_pool_stats()
+        logger.info(
+            "DB pool: size=%s in_use=%s acquires=%s wait_avg=%.1fms wait_max=%.1fms "
+            "queries=%s errors=%s query_avg=%.1fms query_max=%.1fms",
+            stats.get('size'), stats.get('in_use'), stats['acquire_count'],
+            stats['acquire_wait_avg'] * 1000, stats['acquire_wait_max'] * 1000,
+            stats['query_count'], stats['query_errors'],
+            stats['query_time_avg'] * 1000, stats['query_time_max'] * 1000
+        )
+
+
+async def fetch_one(query: str, *args):
+    """Fetch one row from database"""
+    async with acquire() as conn:
         row = await conn.fetchrow(query, *args)
         return dict(row) if row else None
 
 
 async def fetch_all(query: str, *args):
     """Fetch all rows from database"""
-    db_pool = await get_db()
-    async with db_pool.acquire() as conn:
+    async with acquire() as conn:
         rows = await conn.fetch(query, *args)
         return [dict(row) for row in rows]
 
 
+async def fetch_named(name: str, *args) -> list:
+    """Fetch all rows of a registered statement as asyncpg Records (no dict copies)"""
+    async with acquire() as conn:
+        return await conn.fetch(STATEMENTS[name], *args)
+
+
+async def fetchrow_named(name: str, *args):
+    """Fetch one row of a registered statement as an asyncpg Record"""
+    async with acquire() as conn:
+        return await conn.fetchrow(STATEMENTS[name], *args)
+
+
+async def execute_named(name: str, *args) -> str:
+    """Execute a registered statement, returns the status string"""
+    async with acquire() as conn:
+        return await conn.execute(STATEMENTS[name], *args)
+
+
 async def execute(query: str, *args):
     """Execute a query"""
-    db_pool = await get_db()
-    async with db_pool.acquire() as conn:
+    async with acquire() as conn:
         await conn.execute(query, *args)
 
 
 async def executemany(query: str, params_list: list):
     """Execute many queries"""
-    db_pool = await get_db()
-    async with db_pool.acquire() as conn:
+    async with acquire() as conn:
         await conn.executemany(query, params_list)
 
 
+# Seconds between pings of the LISTEN connection; a silently dropped
+# connection is noticed by the ping failing
+LISTEN_PING_INTERVAL = 30
+
+# Longest wait between reconnect attempts of the LISTEN connection
+LISTEN_RECONNECT_MAX_DELAY = 60
+
+
+async def run_listener(handlers: dict, on_reconnect=None):
+    """Background task keeping a dedicated LISTEN connection open
+
+    Calls handlers[channel](payload) for every NOTIFY on one of the channels.
+    The connection is re-opened (with backoff) whenever it is closed by the
+    server or stops answering pings. NOTIFYs sent while it was down are lost,
+    on_reconnect() is called after every reconnect so callers can catch up.
+    """
+    def _dispatch(_conn, _pid, channel, payload):
+        try:
+            handlers[channel](payload)
+        except Exception as e:
+            logger.warning(f"NOTIFY islenemedi ({channel}): {e}")
+
+    delay = 1
+    connected_before = False
+    while True:
+        conn = None
+        try:
+            conn = await asyncpg.connect(DATABASE_URL, timeout=DB_CONNECT_TIMEOUT)
+            lost = asyncio.Event()
+            conn.add_termination_listener(lambda _conn: lost.set())
+            for channel in handlers:
+                await conn.add_listener(channel, _dispatch)
+
+            if connected_before:
+                logger.info(f"LISTEN baglantisi yeniden kuruldu: {', '.join(handlers)}")
+                if on_reconnect is not None:
+                    on_reconnect()
+            connected_before = True
+            delay = 1
+
+            while not lost.is_set():
+                try:
+                    await asyncio.wait_for(lost.wait(), LISTEN_PING_INTERVAL)
+                except asyncio.TimeoutError:
+                    await conn.fetchval("SELECT 1", timeout=DB_CONNECT_TIMEOUT)
+            logger.warning("LISTEN baglantisi kapandi, yeniden baglaniliyor")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"LISTEN baglantisi koptu, {delay}s sonra yeniden denenecek: {e}")
+        finally:
+            if conn is not None and not conn.is_closed():
+                conn.terminate()
+
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, LISTEN_RECONNECT_MAX_DELAY)
+
+
 async def create_tables():
-    """Create all necessary tables"""
+    """Create or upgrade the schema (see bot/database/migrate.py)"""
     async with pool.acquire() as conn:
-        # Filters table - Enhanced for Rose-style filters
-        await conn.execute("""
-            CREATE TABLE IF NOT EXISTS filters (
-                id SERIAL PRIMARY KEY,
-                chat_id BIGINT NOT NULL,
-                keyword TEXT NOT NULL,
-                response TEXT,
-                media_type TEXT,
-                file_id TEXT,
-                buttons TEXT,
-                caption TEXT,
-                filter_type TEXT DEFAULT 'text',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(chat_id, keyword)
-            )
-        """)
-
-        # Members table for tagger
-        await conn.execute("""
-            CREATE TABLE IF NOT EXISTS members (
-                id SERIAL PRIMARY KEY,
-                chat_id BIGINT NOT NULL,
-                user_id BIGINT NOT NULL,
-                username TEXT,
-                first_name TEXT,
-                added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(chat_id, user_id)
-            )
-        """)
-
-        # Chat settings table - Enhanced
-        await conn.execute("""
-            CREATE TABLE IF NOT EXISTS chat_settings (
-                chat_id BIGINT PRIMARY KEY,
-                chat_locked INTEGER DEFAULT 0,
-                previous_permissions TEXT,
-                welcome_enabled INTEGER DEFAULT 1,
-                welcome_message TEXT,
-                admin_only_commands INTEGER DEFAULT 1,
-                delete_non_admin_commands INTEGER DEFAULT 1,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-
-        # Add previous_permissions column if not exists (for existing databases)
-        try:
-            await conn.execute("""
-                ALTER TABLE chat_settings ADD COLUMN IF NOT EXISTS previous_permissions TEXT
-            """)
-        except:
-            pass
-
-        # Active tags table (for ongoing tag sessions)
-        await conn.execute("""
-            CREATE TABLE IF NOT EXISTS active_tags (
-                id SERIAL PRIMARY KEY,
-                chat_id BIGINT UNIQUE NOT NULL,
-                message TEXT,
-                current_index INTEGER DEFAULT 0,
-                is_active INTEGER DEFAULT 1,
-                started_by BIGINT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-
-        # User connections table (for private chat management)
-        await conn.execute("""
-            CREATE TABLE IF NOT EXISTS user_connections (
-                user_id BIGINT PRIMARY KEY,
-                chat_id BIGINT NOT NULL,
-                chat_title TEXT,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+        await run_migrations(conn)
 
 
 async def close_db():
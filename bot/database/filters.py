@@ -1,6 +1,9 @@
-import json
 import re
-from bot.database.connection import get_db, fetch_one, fetch_all, execute
+from bot.database.connection import acquire, fetch_one, fetch_all, execute, register_statement, fetch_named
+from bot.database.invalidation import register_cache, publish_invalidation
+from bot.utils.cache import Generations
+from bot.utils.filter_reply import FilterReply
+from bot.utils.keyword_matcher import KeywordMatcher
 
 
 async def add_filter(
@@ -14,8 +17,8 @@ async def add_filter(
     filter_type: str = 'text'
 ) -> bool:
     """Add or update a filter with all Rose-style features"""
-    # Serialize buttons to JSON if present
-    buttons_json = json.dumps(buttons) if buttons else None
+    # buttons is a JSONB column, the pool's codec serializes the list
+    buttons = buttons or None
 
     await execute("""
         INSERT INTO filters (chat_id, keyword, response, media_type, file_id, buttons, caption, filter_type)
@@ -28,75 +31,54 @@ async def add_filter(
             buttons = EXCLUDED.buttons,
             caption = EXCLUDED.caption,
             filter_type = EXCLUDED.filter_type
-    """, chat_id, keyword.lower(), response, media_type, file_id, buttons_json, caption, filter_type)
+    """, chat_id, keyword.lower(), response, media_type, file_id, buttons, caption, filter_type)
+    invalidate_filter_index(chat_id)
+    await publish_invalidation("filters", chat_id)
     return True
 
 
 async def get_filter(chat_id: int, keyword: str) -> dict | None:
     """Get filter by keyword"""
-    row = await fetch_one("""
+    return await fetch_one("""
         SELECT keyword, response, media_type, file_id, buttons, caption, filter_type
         FROM filters
         WHERE chat_id = $1 AND keyword = $2
     """, chat_id, keyword.lower())
 
-    if not row:
-        return None
-
-    result = dict(row)
-    # Deserialize buttons from JSON
-    if result.get('buttons'):
-        try:
-            result['buttons'] = json.loads(result['buttons'])
-        except (json.JSONDecodeError, TypeError):
-            result['buttons'] = None
-    return result
-
 
 async def get_all_filters(chat_id: int) -> list:
     """Get all filters for a chat"""
-    rows = await fetch_all("""
+    return await fetch_all("""
         SELECT keyword, response, media_type, file_id, buttons, caption, filter_type
         FROM filters
         WHERE chat_id = $1
         ORDER BY keyword
     """, chat_id)
 
-    result = []
-    for row in rows:
-        filter_data = dict(row)
-        # Deserialize buttons from JSON
-        if filter_data.get('buttons'):
-            try:
-                filter_data['buttons'] = json.loads(filter_data['buttons'])
-            except (json.JSONDecodeError, TypeError) as e:
-                print(f"Button JSON parse error: {e}")
-                filter_data['buttons'] = None
-        result.append(filter_data)
-    return result
-
 
 async def delete_filter(chat_id: int, keyword: str) -> bool:
     """Delete a filter"""
-    pool = await get_db()
-    async with pool.acquire() as conn:
+    async with acquire() as conn:
         result = await conn.execute("""
             DELETE FROM filters
             WHERE chat_id = $1 AND keyword = $2
         """, chat_id, keyword.lower())
-        return result != "DELETE 0"
+    invalidate_filter_index(chat_id)
+    await publish_invalidation("filters", chat_id)
+    return result != "DELETE 0"
 
 
 async def delete_all_filters(chat_id: int) -> int:
     """Delete all filters for a chat"""
-    pool = await get_db()
-    async with pool.acquire() as conn:
+    async with acquire() as conn:
         result = await conn.execute("""
             DELETE FROM filters WHERE chat_id = $1
         """, chat_id)
-        # Extract count from "DELETE X"
-        count = int(result.split()[-1]) if result else 0
-        return count
+    invalidate_filter_index(chat_id)
+    await publish_invalidation("filters", chat_id)
+    # Extract count from "DELETE X"
+    count = int(result.split()[-1]) if result else 0
+    return count
 
 
 async def check_filters(chat_id: int, text: str) -> dict | None:
@@ -107,46 +89,87 @@ async def check_filters(chat_id: int, text: str) -> dict | None:
     - exact: filter - matches if text exactly equals the keyword
     - Regular filter - matches if keyword appears ANYWHERE in the text (case-insensitive)
       For example: "merhaba" will match "selam merhaba nasılsın"
+
+    Matching runs against the in-memory filter index, so no database
+    access happens once the chat's index is loaded.
     """
-    rows = await fetch_all("""
-        SELECT keyword, response, media_type, file_id, buttons, caption, filter_type
-        FROM filters
-        WHERE chat_id = $1
-    """, chat_id)
+    matcher, filters_data = await _get_filter_index(chat_id)
+    if not filters_data:
+        return None
+
+    # Single pass over the text regardless of how many filters the chat has;
+    # the matcher returns the position of the first matching filter
+    position = matcher.match(text.lower())
+    if position is None:
+        return None
+
+    record, reply = filters_data[position]
+    return {**record, 'reply': reply}
+
+
+# ==================== IN-MEMORY FILTER INDEX ====================
+
+# chat_id -> (KeywordMatcher, tuple of (filter Record, pre-rendered FilterReply)),
+# in filter creation order
+# Loaded lazily on the first message of a chat and dropped whenever
+# add_filter / delete_filter / delete_all_filters change that chat, in this
+# process or (with MULTI_INSTANCE) in another replica
+_filter_index: dict[int, tuple] = {}
+
+# So a load that raced with a write never stores a stale index
+_filter_generations = Generations()
+
+FILTERS_BY_CHAT = register_statement("filters.by_chat", """
+    SELECT keyword, response, media_type, file_id, buttons, caption, filter_type
+    FROM filters
+    WHERE chat_id = $1
+    ORDER BY id
+""")
+
+
+def invalidate_filter_index(chat_id: int):
+    """Drop the cached filter index of a chat"""
+    _filter_index.pop(chat_id, None)
+    _filter_generations.invalidate(chat_id)
+
+
+def _clear_filter_index():
+    _filter_index.clear()
+    _filter_generations.invalidate_all()
+
 
-    text_lower = text.lower()
+register_cache("filters", invalidate_filter_index, _clear_filter_index)
 
-    for row in rows:
-        keyword = row['keyword']
-        matched = False
 
-        # Handle different filter types
+def _build_filter_index(rows: list) -> tuple:
+    """Compile the keyword matcher for a chat's filter rows"""
+    entries = []
+    filters_data = []
+    for record in rows:
+        keyword = record['keyword']
         if keyword.startswith('prefix:'):
-            # Prefix filter - check if text starts with the prefix
-            prefix = keyword[7:]  # Remove 'prefix:'
-            matched = text_lower.startswith(prefix.lower())
+            kind, needle = 'prefix', keyword[7:].lower()  # Remove 'prefix:'
         elif keyword.startswith('exact:'):
-            # Exact filter - exact match only
-            exact = keyword[6:]  # Remove 'exact:'
-            matched = text_lower == exact.lower()
+            kind, needle = 'exact', keyword[6:].lower()  # Remove 'exact:'
         else:
-            # Regular filter - keyword should appear anywhere in the text
-            # This allows "merhaba" to match "selam merhaba nasılsın"
-            keyword_lower = keyword.lower()
-
-            # Check if keyword contains the text (for any position matching)
-            # Use simple substring matching - keyword anywhere in the message
-            matched = keyword_lower in text_lower
-
-        if matched:
-            result = dict(row)
-            # Deserialize buttons from JSON
-            if result.get('buttons'):
-                try:
-                    result['buttons'] = json.loads(result['buttons'])
-                except (json.JSONDecodeError, TypeError) as e:
-                    print(f"Button JSON parse error: {e}")
-                    result['buttons'] = None
-            return result
-
-    return None
+            kind, needle = 'contains', keyword.lower()
+        entries.append((kind, needle))
+        # Pre-rendered reply, so firing the filter does no parsing
+        filters_data.append((record, FilterReply.from_filter(record)))
+    return KeywordMatcher(entries), tuple(filters_data)
+
+
+async def _get_filter_index(chat_id: int) -> tuple:
+    """Return the filter index of a chat, loading it from the database if needed"""
+    index = _filter_index.get(chat_id)
+    if index is not None:
+        return index
+
+    with _filter_generations.load(chat_id) as still_current:
+        rows = await fetch_named(FILTERS_BY_CHAT, chat_id)
+        index = _build_filter_index(rows)
+
+        # Only publish the index if no filter changed while we were loading
+        if still_current():
+            _filter_index[chat_id] = index
+    return index
@@ -0,0 +1,60 @@
+"""
+Cache Invalidation
+Keeps the in-process caches of several bot replicas consistent.
+
+- A process that changes cached data drops its own entry and publishes
+  "<cache>:<key>" on the cache_invalidate NOTIFY channel (MULTI_INSTANCE only)
+- Every other replica drops the same entry when the notification arrives
+- Notifications sent while a replica's LISTEN connection was down are lost,
+  so it drops its caches entirely after reconnecting
+"""
+
+import logging
+import uuid
+from typing import Callable
+
+from bot.config import MULTI_INSTANCE
+from bot.database.connection import execute
+
+logger = logging.getLogger(__name__)
+
+# NOTIFY channel carrying cache invalidations, payload "<cache>:<key>:<sender>"
+CACHE_CHANNEL = "cache_invalidate"
+
+# Tags our own notifications so we don't drop entries we just wrote
+_SENDER = uuid.uuid4().hex[:8]
+
+# cache name -> (drop one key, drop everything)
+_caches: dict[str, tuple[Callable[[int], None], Callable[[], None]]] = {}
+
+
+def register_cache(name: str, invalidate: Callable[[int], None], clear: Callable[[], None]):
+    """Make a cache invalidatable from other replicas"""
+    _caches[name] = (invalidate, clear)
+
+
+async def publish_invalidation(name: str, key: int):
+    """Tell the other replicas to drop key from the named cache"""
+    if not MULTI_INSTANCE:
+        return
+    try:
+        await execute("SELECT pg_notify($1, $2)", CACHE_CHANNEL, f"{name}:{key}:{_SENDER}")
+    except Exception as e:
+        # Other replicas still catch up through their cache TTLs
+        logger.warning(f"Onbellek gecersizlestirme yayinlanamadi ({name}:{key}): {e}")
+
+
+def on_invalidation(payload: str):
+    """NOTIFY handler for CACHE_CHANNEL"""
+    name, _, rest = payload.partition(':')
+    key, _, sender = rest.partition(':')
+    cache = _caches.get(name)
+    if cache is None or sender == _SENDER or not key.lstrip('-').isdigit():
+        return
+    cache[0](int(key))
+
+
+def clear_caches():
+    """Drop every registered cache (after missing notifications)"""
+    for _, clear in _caches.values():
+        clear()
@@ -1,4 +1,32 @@
-from bot.database.connection import get_db, fetch_one, fetch_all, execute
+import asyncio
+import logging
+
+from bot.database.connection import (
+    acquire, fetch_one, execute, register_statement, fetch_named, execute_named, STATEMENTS
+)
+from bot.utils.cache import TTLCache
+from bot.utils.helpers import cache_mention, forget_mentions
+
+logger = logging.getLogger(__name__)
+
+# Set-based upsert for many (chat_id, user_id, username, first_name) rows in one statement
+# Rows whose names did not change are left untouched
+UPSERT_MEMBERS = register_statement("members.upsert", """
+    INSERT INTO members (chat_id, user_id, username, first_name)
+    SELECT * FROM unnest($1::bigint[], $2::bigint[], $3::text[], $4::text[])
+    ON CONFLICT (chat_id, user_id)
+    DO UPDATE SET username = EXCLUDED.username, first_name = EXCLUDED.first_name
+    WHERE members.username IS DISTINCT FROM EXCLUDED.username
+       OR members.first_name IS DISTINCT FROM EXCLUDED.first_name
+""")
+
+# One keyset page of members, see iter_members
+MEMBERS_PAGE = register_statement("members.page", """
+    SELECT id, user_id, username, first_name FROM members
+    WHERE chat_id = $1 AND id > $2
+    ORDER BY id
+    LIMIT $3
+""")
 
 
 async def save_member(chat_id: int, user_id: int, username: str = None, first_name: str = None):
@@ -9,41 +37,66 @@ async def save_member(chat_id: int, user_id: int, username: str = None, first_na
         ON CONFLICT (chat_id, user_id)
         DO UPDATE SET username = EXCLUDED.username, first_name = EXCLUDED.first_name
     """, chat_id, user_id, username, first_name)
+    cache_mention(chat_id, user_id, username, first_name)
 
 
 async def save_members_bulk(chat_id: int, members: list, replace_all: bool = False):
     """Save multiple members at once
 
+    The whole list is sent as arrays in a single set-based upsert and
+    applied atomically together with the optional delete.
+
     Args:
         chat_id: Chat ID
         members: List of member dictionaries
         replace_all: If True, delete existing members first (use with caution)
     """
-    pool = await get_db()
-
-    async with pool.acquire() as conn:
-        # Only delete if explicitly requested AND we have new members to add
-        if replace_all and members:
-            await conn.execute("DELETE FROM members WHERE chat_id = $1", chat_id)
-
-        # Insert or update members
-        for member in members:
-            await conn.execute("""
-                INSERT INTO members (chat_id, user_id, username, first_name)
-                VALUES ($1, $2, $3, $4)
-                ON CONFLICT (chat_id, user_id)
-                DO UPDATE SET username = EXCLUDED.username, first_name = EXCLUDED.first_name
-            """, chat_id, member['user_id'], member.get('username'), member.get('first_name'))
-
-
-async def get_all_members(chat_id: int) -> list:
-    """Get all members for a chat"""
-    rows = await fetch_all("""
-        SELECT user_id, username, first_name FROM members
-        WHERE chat_id = $1
-        ORDER BY id
-    """, chat_id)
-    return rows
+    if not members:
+        return
+
+    # One row per user - the last entry wins, like the old row-by-row loop
+    latest = {}
+    for member in members:
+        latest[member['user_id']] = (member.get('username'), member.get('first_name'))
+
+    chat_ids = [chat_id] * len(latest)
+    user_ids = list(latest)
+    usernames = [names[0] for names in latest.values()]
+    first_names = [names[1] for names in latest.values()]
+
+    async with acquire() as conn:
+        async with conn.transaction():
+            if replace_all:
+                await conn.execute("DELETE FROM members WHERE chat_id = $1", chat_id)
+
+            await conn.execute(STATEMENTS[UPSERT_MEMBERS], chat_ids, user_ids, usernames, first_names)
+
+    if replace_all:
+        forget_known_members(chat_id)
+        forget_mentions(chat_id)
+    for user_id, (username, first_name) in latest.items():
+        _known_members.set((chat_id, user_id), (username, first_name))
+        cache_mention(chat_id, user_id, username, first_name)
+
+
+async def iter_members(chat_id: int, after_id: int = 0, page_size: int = 500):
+    """Stream members of a chat in id order
+
+    Pages are fetched by keyset (id > last seen id), so every page costs the
+    same no matter how deep the iteration is, and only one page is held in
+    memory. Yielded rows are asyncpg Records (read-only, support ['key'] and
+    .get()) and include the member row 'id' as a resume cursor.
+    """
+    last_id = after_id
+    while True:
+        rows = await fetch_named(MEMBERS_PAGE, chat_id, last_id, page_size)
+
+        for row in rows:
+            yield row
+
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1]['id']
 
 
 async def get_members_count(chat_id: int) -> int:
@@ -55,24 +108,113 @@ async def get_members_count(chat_id: int) -> int:
     return row['count'] if row else 0
 
 
-async def get_members_batch(chat_id: int, offset: int, limit: int = 5) -> list:
-    """Get batch of members for tagging"""
-    rows = await fetch_all("""
-        SELECT user_id, username, first_name FROM members
-        WHERE chat_id = $1
-        ORDER BY id
-        LIMIT $2 OFFSET $3
-    """, chat_id, limit, offset)
-    return rows
-
-
 async def delete_all_members(chat_id: int) -> int:
     """Delete all members for a chat"""
-    pool = await get_db()
-    async with pool.acquire() as conn:
-        result = await conn.execute("""
-            DELETE FROM members WHERE chat_id = $1
-        """, chat_id)
-        # Extract count from "DELETE X"
-        count = int(result.split()[-1]) if result else 0
-        return count
+    # Under the flush lock, so a flush in flight can't write the chat's rows
+    # back after the DELETE and queued ones are dropped instead of flushed
+    async with _flush_lock:
+        for key in [key for key in _pending_members if key[0] == chat_id]:
+            del _pending_members[key]
+        async with acquire() as conn:
+            result = await conn.execute("""
+                DELETE FROM members WHERE chat_id = $1
+            """, chat_id)
+        forget_known_members(chat_id)
+    forget_mentions(chat_id)
+    # Extract count from "DELETE X"
+    count = int(result.split()[-1]) if result else 0
+    return count
+
+
+# ==================== WRITE-BEHIND MEMBER BUFFER ====================
+
+# Flush the buffer at least this often (seconds) or once it holds this many rows
+MEMBER_FLUSH_INTERVAL = 5
+MEMBER_FLUSH_SIZE = 500
+
+# (chat_id, user_id) -> (username, first_name) already stored in the database
+_known_members = TTLCache(maxsize=100_000, ttl=6 * 3600)
+
+# (chat_id, user_id) -> latest (username, first_name) waiting to be written
+_pending_members: dict[tuple, tuple] = {}
+
+_flush_lock = asyncio.Lock()
+_flush_task: asyncio.Task | None = None
+
+
+def forget_known_members(chat_id: int):
+    """Forget which members of a chat are stored, after rows were deleted"""
+    _known_members.discard_where(lambda key: key[0] == chat_id)
+
+
+def queue_member(chat_id: int, user_id: int, username: str = None, first_name: str = None):
+    """Queue a member upsert without waiting for the database
+
+    Writes for members whose names are already stored are dropped, and
+    only the latest value per (chat_id, user_id) is kept until the next flush.
+    """
+    global _flush_task
+    key = (chat_id, user_id)
+    value = (username, first_name)
+
+    if _pending_members.get(key) == value or _known_members.get(key) == value:
+        return
+    _pending_members[key] = value
+
+    # Size trigger - flush in the background instead of waiting for the timer
+    if len(_pending_members) >= MEMBER_FLUSH_SIZE and (_flush_task is None or _flush_task.done()):
+        _flush_task = asyncio.create_task(flush_member_buffer())
+
+
+async def flush_member_buffer() -> int:
+    """Write all queued members in one bulk statement, returns rows written"""
+    async with _flush_lock:
+        if not _pending_members:
+            return 0
+
+        batch = dict(_pending_members)
+        _pending_members.clear()
+
+        chat_ids, user_ids, usernames, first_names = [], [], [], []
+        for (chat_id, user_id), (username, first_name) in batch.items():
+            chat_ids.append(chat_id)
+            user_ids.append(user_id)
+            usernames.append(username)
+            first_names.append(first_name)
+
+        try:
+            await execute_named(UPSERT_MEMBERS, chat_ids, user_ids, usernames, first_names)
+        except BaseException as e:
+            # Put the rows back unless a newer value arrived meanwhile; also on
+            # cancellation, so the shutdown flush still writes them
+            for key, value in batch.items():
+                _pending_members.setdefault(key, value)
+            if not isinstance(e, Exception):
+                raise
+            logger.warning(f"Uye tamponu yazilamadi ({len(batch)} kayit): {e}")
+            return 0
+
+        for (chat_id, user_id), (username, first_name) in batch.items():
+            _known_members.set((chat_id, user_id), (username, first_name))
+            cache_mention(chat_id, user_id, username, first_name)
+        return len(batch)
+
+
+async def run_member_flusher():
+    """Background task flushing the member buffer on a timer"""
+    while True:
+        await asyncio.sleep(MEMBER_FLUSH_INTERVAL)
+        try:
+            await flush_member_buffer()
+        except Exception as e:
+            logger.warning(f"Uye tamponu hatasi: {e}")
+
+
+async def stop_member_flusher(flusher: asyncio.Task) -> int:
+    """Stop run_member_flusher and write what is still buffered, returns rows written"""
+    flusher.cancel()
+    await asyncio.gather(flusher, return_exceptions=True)
+    # A size-triggered flush may still be running
+    if _flush_task is not None:
+        await asyncio.gather(_flush_task, return_exceptions=True)
+    return await flush_member_buffer()
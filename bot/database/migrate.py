@@ -0,0 +1,89 @@
+"""
+Schema Migrations
+Applies the numbered SQL files in bot/database/migrations/ in order.
+
+- schema_version keeps one row per applied migration
+- Boot only runs a single version check when the schema is up to date
+- Pending migrations run under a Postgres advisory lock so replicas
+  starting at the same time don't apply them twice
+"""
+
+import logging
+import re
+from pathlib import Path
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+
+# Arbitrary key for pg_advisory_lock, shared by every replica of the bot
+MIGRATION_LOCK_ID = 0x7461676765720001
+
+# Index builds on big tables and waiting for another replica's lock can
+# take longer than the pool's command/statement timeouts
+MIGRATION_TIMEOUT = 600
+
+_FILENAME_RE = re.compile(r"^(\d+)_([\w-]+)\.sql$")
+
+
+def load_migrations() -> list:
+    """Return [(version, name, sql)] sorted by version"""
+    migrations = []
+    for path in MIGRATIONS_DIR.iterdir():
+        match = _FILENAME_RE.match(path.name)
+        if not match:
+            continue
+        migrations.append((int(match.group(1)), match.group(2), path.read_text(encoding="utf-8")))
+    migrations.sort()
+
+    versions = [version for version, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Duplicate migration version in {MIGRATIONS_DIR}")
+    return migrations
+
+
+async def get_schema_version(conn) -> int:
+    """Highest applied migration, 0 for a database without schema_version"""
+    try:
+        return await conn.fetchval("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    except asyncpg.UndefinedTableError:
+        return 0
+
+
+async def run_migrations(conn):
+    """Bring the schema up to date"""
+    migrations = load_migrations()
+    latest = migrations[-1][0] if migrations else 0
+
+    # Fast path: nothing to do
+    if await get_schema_version(conn) >= latest:
+        return
+
+    await conn.execute("SET statement_timeout = 0")
+    await conn.execute("SELECT pg_advisory_lock($1)", MIGRATION_LOCK_ID, timeout=MIGRATION_TIMEOUT)
+    try:
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        # Another replica may have migrated while we waited for the lock
+        current = await get_schema_version(conn)
+        for version, name, sql in migrations:
+            if version <= current:
+                continue
+            logger.info(f"Migration uygulaniyor: {version:04d}_{name}")
+            async with conn.transaction():
+                await conn.execute(sql, timeout=MIGRATION_TIMEOUT)
+                await conn.execute(
+                    "INSERT INTO schema_version (version, name) VALUES ($1, $2)",
+                    version, name
+                )
+    finally:
+        await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATION_LOCK_ID)
+        await conn.execute("RESET statement_timeout")
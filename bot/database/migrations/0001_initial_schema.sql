@@ -0,0 +1,65 @@
+-- Schema as created by the old create_tables() on startup.
+-- Everything is IF NOT EXISTS so existing databases adopt it unchanged.
+
+-- Filters table - Enhanced for Rose-style filters
+CREATE TABLE IF NOT EXISTS filters (
+    id SERIAL PRIMARY KEY,
+    chat_id BIGINT NOT NULL,
+    keyword TEXT NOT NULL,
+    response TEXT,
+    media_type TEXT,
+    file_id TEXT,
+    buttons TEXT,
+    caption TEXT,
+    filter_type TEXT DEFAULT 'text',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(chat_id, keyword)
+);
+
+-- Members table for tagger
+CREATE TABLE IF NOT EXISTS members (
+    id SERIAL PRIMARY KEY,
+    chat_id BIGINT NOT NULL,
+    user_id BIGINT NOT NULL,
+    username TEXT,
+    first_name TEXT,
+    added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(chat_id, user_id)
+);
+
+-- Chat settings table - Enhanced
+CREATE TABLE IF NOT EXISTS chat_settings (
+    chat_id BIGINT PRIMARY KEY,
+    chat_locked INTEGER DEFAULT 0,
+    previous_permissions TEXT,
+    welcome_enabled INTEGER DEFAULT 1,
+    welcome_message TEXT,
+    admin_only_commands INTEGER DEFAULT 1,
+    delete_non_admin_commands INTEGER DEFAULT 1,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Older databases were created without previous_permissions
+ALTER TABLE chat_settings ADD COLUMN IF NOT EXISTS previous_permissions TEXT;
+
+-- Active tags table (for ongoing tag sessions)
+CREATE TABLE IF NOT EXISTS active_tags (
+    id SERIAL PRIMARY KEY,
+    chat_id BIGINT UNIQUE NOT NULL,
+    message TEXT,
+    current_index INTEGER DEFAULT 0,
+    is_active INTEGER DEFAULT 1,
+    started_by BIGINT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Resume cursor for tag sessions (members.id of the last tagged member)
+ALTER TABLE active_tags ADD COLUMN IF NOT EXISTS last_member_id BIGINT DEFAULT 0;
+
+-- User connections table (for private chat management)
+CREATE TABLE IF NOT EXISTS user_connections (
+    user_id BIGINT PRIMARY KEY,
+    chat_id BIGINT NOT NULL,
+    chat_title TEXT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,15 @@
+-- Indexes for the queries run on every message / tag batch.
+
+-- Member pages for the tagger (WHERE chat_id = $1 AND id > $2 ORDER BY id),
+-- also serves member counts and per-chat deletes
+CREATE INDEX IF NOT EXISTS members_chat_id_id_idx ON members (chat_id, id);
+
+-- Filter index load (WHERE chat_id = $1 ORDER BY id)
+CREATE INDEX IF NOT EXISTS filters_chat_id_id_idx ON filters (chat_id, id);
+
+-- Resuming tag sessions after a restart only looks at active rows
+CREATE INDEX IF NOT EXISTS active_tags_active_idx ON active_tags (chat_id) WHERE is_active = 1;
+
+-- is_active is used as a boolean flag; NOT VALID keeps existing rows untouched
+ALTER TABLE active_tags
+    ADD CONSTRAINT active_tags_is_active_check CHECK (is_active IN (0, 1)) NOT VALID;
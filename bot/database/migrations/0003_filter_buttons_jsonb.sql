@@ -0,0 +1,4 @@
+-- Filter buttons were stored as json.dumps() text; keep them as JSONB so
+-- asyncpg decodes them with the pool's codec instead of json.loads per read.
+ALTER TABLE filters
+    ALTER COLUMN buttons TYPE JSONB USING NULLIF(buttons, '')::jsonb;
@@ -0,0 +1,4 @@
+-- Every /etiket bumps run_id; progress writes and the final stop carry the
+-- run_id of the task that made them, so a superseded task can't move the
+-- cursor of the session that replaced it.
+ALTER TABLE active_tags ADD COLUMN IF NOT EXISTS run_id BIGINT NOT NULL DEFAULT 0;
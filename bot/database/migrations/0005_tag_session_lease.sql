@@ -0,0 +1,4 @@
+-- A running tag session is leased by the process running it; other replicas
+-- only take it over once the lease has expired (owner crashed or stopped).
+ALTER TABLE active_tags ADD COLUMN IF NOT EXISTS owner TEXT;
+ALTER TABLE active_tags ADD COLUMN IF NOT EXISTS lease_until TIMESTAMP;
@@ -1,33 +1,106 @@
 import json
-from bot.database.connection import get_db, fetch_all, fetch_one, execute
+from datetime import datetime
+from typing import TypedDict
+
+from asyncpg import Record
+
+from bot.config import MULTI_INSTANCE
+from bot.database.connection import (
+    acquire, fetch_all, fetch_one, execute, register_statement, fetchrow_named, execute_named
+)
+from bot.database.invalidation import register_cache, publish_invalidation
+from bot.utils.cache import TTLCache, Generations
+
+# NOTIFY channel carrying the chat_id of stopped tag sessions to other replicas
+TAG_STOP_CHANNEL = "tag_stop"
+
+# Seconds a process owns a tag session without renewing the lease
+TAG_LEASE_SECONDS = 90
+
+# ==================== CHAT SETTINGS CACHE ====================
+
+class ChatSettings(TypedDict, total=False):
+    """A chat_settings row"""
+    chat_id: int
+    chat_locked: int
+    previous_permissions: str | None
+    welcome_enabled: int
+    welcome_message: str | None
+    admin_only_commands: int
+    delete_non_admin_commands: int
+    updated_at: datetime
+
+
+# chat_id -> chat_settings Record (or default ChatSettings), read-through on get and refreshed by every setter
+_settings_cache = TTLCache(maxsize=1000, ttl=600)
+
+# So a read that raced with a setter never caches old values
+_settings_generations = Generations()
+
+SETTINGS_BY_CHAT = register_statement("settings.by_chat", """
+    SELECT * FROM chat_settings WHERE chat_id = $1
+""")
+
+
+def _invalidate_settings(chat_id: int):
+    _settings_cache.pop(chat_id)
+    _settings_generations.invalidate(chat_id)
+
+
+def _clear_settings():
+    _settings_cache.clear()
+    _settings_generations.invalidate_all()
 
-async def get_chat_settings(chat_id: int) -> dict:
-    """Get chat settings"""
-    row = await fetch_one("""
-        SELECT * FROM chat_settings WHERE chat_id = $1
-    """, chat_id)
 
+register_cache("settings", _invalidate_settings, _clear_settings)
+
+
+async def _write_settings(chat_id: int, query: str, *args):
+    """Run a chat_settings write ending in RETURNING * and cache the stored row"""
+    _invalidate_settings(chat_id)
+    async with acquire() as conn:
+        row = await conn.fetchrow(query, *args)
+    # Invalidate again - reads started during the write must not publish
+    _invalidate_settings(chat_id)
     if row:
-        return dict(row)
-    return {
-        'chat_id': chat_id,
-        'chat_locked': False,
-        'welcome_enabled': True,
-        'welcome_message': None,
-        'admin_only_commands': True,
-        'delete_non_admin_commands': True
-    }
+        _settings_cache.set(chat_id, row)
+    await publish_invalidation("settings", chat_id)
+
+
+async def get_chat_settings(chat_id: int) -> Record | ChatSettings:
+    """Get chat settings (cached - the stored row as a read-only Record, or defaults)"""
+    settings = _settings_cache.get(chat_id)
+    if settings is not None:
+        return settings
+
+    with _settings_generations.load(chat_id) as still_current:
+        row = await fetchrow_named(SETTINGS_BY_CHAT, chat_id)
+
+        if row:
+            settings = row
+        else:
+            settings = ChatSettings(
+                chat_id=chat_id,
+                chat_locked=False,
+                welcome_enabled=True,
+                welcome_message=None,
+                admin_only_commands=True,
+                delete_non_admin_commands=True
+            )
+
+        if still_current():
+            _settings_cache.set(chat_id, settings)
+    return settings
 
 async def set_chat_locked(chat_id: int, locked: bool):
     """Set chat lock status"""
-    pool = await get_db()
-    async with pool.acquire() as conn:
-        await conn.execute("""
-            INSERT INTO chat_settings (chat_id, chat_locked)
-            VALUES ($1, $2)
-            ON CONFLICT (chat_id)
-            DO UPDATE SET chat_locked = EXCLUDED.chat_locked, updated_at = CURRENT_TIMESTAMP
-        """, chat_id, 1 if locked else 0)
+    await _write_settings(chat_id, """
+        INSERT INTO chat_settings (chat_id, chat_locked)
+        VALUES ($1, $2)
+        ON CONFLICT (chat_id)
+        DO UPDATE SET chat_locked = EXCLUDED.chat_locked, updated_at = CURRENT_TIMESTAMP
+        RETURNING *
+    """, chat_id, 1 if locked else 0)
 
 async def is_chat_locked(chat_id: int) -> bool:
     """Check if chat is locked"""
@@ -36,14 +109,13 @@ async def is_chat_locked(chat_id: int) -> bool:
 
 async def save_previous_permissions(chat_id: int, permissions: dict):
     """Save previous permissions before locking"""
-    pool = await get_db()
-    async with pool.acquire() as conn:
-        await conn.execute("""
-            INSERT INTO chat_settings (chat_id, previous_permissions)
-            VALUES ($1, $2)
-            ON CONFLICT (chat_id)
-            DO UPDATE SET previous_permissions = EXCLUDED.previous_permissions, updated_at = CURRENT_TIMESTAMP
-        """, chat_id, json.dumps(permissions))
+    await _write_settings(chat_id, """
+        INSERT INTO chat_settings (chat_id, previous_permissions)
+        VALUES ($1, $2)
+        ON CONFLICT (chat_id)
+        DO UPDATE SET previous_permissions = EXCLUDED.previous_permissions, updated_at = CURRENT_TIMESTAMP
+        RETURNING *
+    """, chat_id, json.dumps(permissions))
 
 async def get_previous_permissions(chat_id: int) -> dict | None:
     """Get saved previous permissions"""
@@ -58,49 +130,45 @@ async def get_previous_permissions(chat_id: int) -> dict | None:
 
 async def clear_previous_permissions(chat_id: int):
     """Clear saved previous permissions after unlocking"""
-    pool = await get_db()
-    async with pool.acquire() as conn:
-        await conn.execute("""
-            UPDATE chat_settings SET previous_permissions = NULL
-            WHERE chat_id = $1
-        """, chat_id)
+    await _write_settings(chat_id, """
+        UPDATE chat_settings SET previous_permissions = NULL
+        WHERE chat_id = $1
+        RETURNING *
+    """, chat_id)
 
 async def set_welcome_message(chat_id: int, message: str):
     """Set welcome message"""
-    pool = await get_db()
-    async with pool.acquire() as conn:
-        await conn.execute("""
-            INSERT INTO chat_settings (chat_id, welcome_message, welcome_enabled)
-            VALUES ($1, $2, 1)
-            ON CONFLICT (chat_id)
-            DO UPDATE SET welcome_message = EXCLUDED.welcome_message, welcome_enabled = 1, updated_at = CURRENT_TIMESTAMP
-        """, chat_id, message)
+    await _write_settings(chat_id, """
+        INSERT INTO chat_settings (chat_id, welcome_message, welcome_enabled)
+        VALUES ($1, $2, 1)
+        ON CONFLICT (chat_id)
+        DO UPDATE SET welcome_message = EXCLUDED.welcome_message, welcome_enabled = 1, updated_at = CURRENT_TIMESTAMP
+        RETURNING *
+    """, chat_id, message)
 
 async def toggle_welcome(chat_id: int, enabled: bool):
     """Toggle welcome messages"""
-    pool = await get_db()
-    async with pool.acquire() as conn:
-        await conn.execute("""
-            INSERT INTO chat_settings (chat_id, welcome_enabled)
-            VALUES ($1, $2)
-            ON CONFLICT (chat_id)
-            DO UPDATE SET welcome_enabled = EXCLUDED.welcome_enabled, updated_at = CURRENT_TIMESTAMP
-        """, chat_id, 1 if enabled else 0)
+    await _write_settings(chat_id, """
+        INSERT INTO chat_settings (chat_id, welcome_enabled)
+        VALUES ($1, $2)
+        ON CONFLICT (chat_id)
+        DO UPDATE SET welcome_enabled = EXCLUDED.welcome_enabled, updated_at = CURRENT_TIMESTAMP
+        RETURNING *
+    """, chat_id, 1 if enabled else 0)
 
 # Admin-only mode management
 async def set_admin_only_mode(chat_id: int, enabled: bool):
     """Set admin-only command mode"""
-    pool = await get_db()
-    async with pool.acquire() as conn:
-        await conn.execute("""
-            INSERT INTO chat_settings (chat_id, admin_only_commands, delete_non_admin_commands)
-            VALUES ($1, $2, $3)
-            ON CONFLICT (chat_id)
-            DO UPDATE SET
-                admin_only_commands = EXCLUDED.admin_only_commands,
-                delete_non_admin_commands = EXCLUDED.delete_non_admin_commands,
-                updated_at = CURRENT_TIMESTAMP
-        """, chat_id, 1 if enabled else 0, 1 if enabled else 0)
+    await _write_settings(chat_id, """
+        INSERT INTO chat_settings (chat_id, admin_only_commands, delete_non_admin_commands)
+        VALUES ($1, $2, $3)
+        ON CONFLICT (chat_id)
+        DO UPDATE SET
+            admin_only_commands = EXCLUDED.admin_only_commands,
+            delete_non_admin_commands = EXCLUDED.delete_non_admin_commands,
+            updated_at = CURRENT_TIMESTAMP
+        RETURNING *
+    """, chat_id, 1 if enabled else 0, 1 if enabled else 0)
 
 async def is_admin_only_mode(chat_id: int) -> bool:
     """Check if admin-only mode is enabled"""
@@ -108,68 +176,152 @@ async def is_admin_only_mode(chat_id: int) -> bool:
     return settings.get('admin_only_commands', True)
 
 # Active tags management
-async def start_tag_session(chat_id: int, message: str, started_by: int):
-    """Start a new tag session"""
-    pool = await get_db()
-    async with pool.acquire() as conn:
-        await conn.execute("""
-            INSERT INTO active_tags (chat_id, message, current_index, is_active, started_by)
-            VALUES ($1, $2, 0, 1, $3)
+async def start_tag_session(chat_id: int, message: str, started_by: int, owner: str) -> int:
+    """Start a new tag session leased to owner, replacing the chat's previous one
+
+    Returns:
+        int: run_id of the new session, required by update_tag_index
+    """
+    async with acquire() as conn:
+        return await conn.fetchval("""
+            INSERT INTO active_tags (chat_id, message, current_index, last_member_id, is_active, started_by,
+                run_id, owner, lease_until)
+            VALUES ($1, $2, 0, 0, 1, $3, 1, $4, NOW() + make_interval(secs => $5))
             ON CONFLICT (chat_id)
-            DO UPDATE SET message = EXCLUDED.message, current_index = 0, is_active = 1, started_by = EXCLUDED.started_by
-        """, chat_id, message, started_by)
+            DO UPDATE SET message = EXCLUDED.message, current_index = 0, last_member_id = 0,
+                is_active = 1, started_by = EXCLUDED.started_by, run_id = active_tags.run_id + 1,
+                owner = EXCLUDED.owner, lease_until = EXCLUDED.lease_until
+            RETURNING run_id
+        """, chat_id, message, started_by, owner, TAG_LEASE_SECONDS)
 
 async def get_tag_session(chat_id: int) -> dict | None:
     """Get active tag session"""
-    row = await fetch_one("""
+    return await fetch_one("""
         SELECT * FROM active_tags
         WHERE chat_id = $1 AND is_active = 1
     """, chat_id)
-    return dict(row) if row else None
 
-async def update_tag_index(chat_id: int, new_index: int):
-    """Update tag session index"""
-    pool = await get_db()
-    async with pool.acquire() as conn:
-        await conn.execute("""
-            UPDATE active_tags SET current_index = $1
-            WHERE chat_id = $2
-        """, new_index, chat_id)
-
-async def stop_tag_session(chat_id: int):
-    """Stop tag session"""
-    pool = await get_db()
-    async with pool.acquire() as conn:
+async def claim_tag_sessions(owner: str) -> list:
+    """Take over every active session whose lease is free or expired
+
+    Used on startup and periodically afterwards, so sessions of a stopped or
+    crashed replica are resumed exactly once. Row locks make concurrent
+    claims from several replicas hand each session to one of them.
+    """
+    return await fetch_all("""
+        UPDATE active_tags SET owner = $1, lease_until = NOW() + make_interval(secs => $2)
+        WHERE is_active = 1 AND (lease_until IS NULL OR lease_until < NOW())
+        RETURNING *
+    """, owner, TAG_LEASE_SECONDS)
+
+async def renew_tag_leases(owner: str, chat_ids: list):
+    """Extend the leases of the sessions owner is running"""
+    await execute("""
+        UPDATE active_tags SET lease_until = NOW() + make_interval(secs => $3)
+        WHERE owner = $1 AND chat_id = ANY($2::bigint[]) AND is_active = 1
+    """, owner, chat_ids, TAG_LEASE_SECONDS)
+
+async def release_tag_leases(owner: str):
+    """Give up owner's leases (on shutdown) so another replica resumes them right away"""
+    await execute("""
+        UPDATE active_tags SET lease_until = NULL
+        WHERE owner = $1 AND is_active = 1
+    """, owner)
+
+UPDATE_TAG_INDEX = register_statement("tags.update_index", """
+    UPDATE active_tags SET current_index = $1, last_member_id = $2,
+        lease_until = NOW() + make_interval(secs => $6)
+    WHERE chat_id = $3 AND run_id = $4 AND owner = $5 AND is_active = 1
+""")
+
+async def update_tag_index(chat_id: int, run_id: int, owner: str, new_index: int, last_member_id: int) -> bool:
+    """Update tag session progress and resume cursor, renewing the lease
+
+    Returns False (and writes nothing) if the session was stopped, restarted
+    with a newer run_id or taken over by another process - the caller should
+    stop tagging.
+    """
+    status = await execute_named(
+        UPDATE_TAG_INDEX, new_index, last_member_id, chat_id, run_id, owner, TAG_LEASE_SECONDS
+    )
+    return status == "UPDATE 1"
+
+async def stop_tag_session(chat_id: int, notify: bool = False, run_id: int | None = None):
+    """Stop tag session
+
+    With run_id only that run is stopped, a newer session of the chat is
+    left alone. With notify=True (and MULTI_INSTANCE enabled) other bot
+    processes are told to stop their running session for this chat too.
+    """
+    async with acquire() as conn:
         await conn.execute("""
             UPDATE active_tags SET is_active = 0
-            WHERE chat_id = $1
-        """, chat_id)
+            WHERE chat_id = $1 AND ($2::bigint IS NULL OR run_id = $2)
+        """, chat_id, run_id)
+        if notify and MULTI_INSTANCE:
+            await conn.execute("SELECT pg_notify($1, $2)", TAG_STOP_CHANNEL, str(chat_id))
 
 # User connection management (for private chat admin)
+
+# user_id -> {'chat_id', 'chat_title'} or _NO_CONNECTION, kept current by connect/disconnect
+# Unconnected users are cached too - most private messages come from them
+_connection_cache = TTLCache(maxsize=10000, ttl=3600)
+_connection_generations = Generations()
+_NO_CONNECTION = object()
+
+CONNECTION_BY_USER = register_statement("connections.by_user", """
+    SELECT chat_id, chat_title FROM user_connections WHERE user_id = $1
+""")
+
+
+def _invalidate_connection(user_id: int):
+    _connection_cache.pop(user_id)
+    _connection_generations.invalidate(user_id)
+
+
+def _clear_connections():
+    _connection_cache.clear()
+    _connection_generations.invalidate_all()
+
+
+register_cache("connections", _invalidate_connection, _clear_connections)
+
+
 async def connect_user_to_chat(user_id: int, chat_id: int, chat_title: str):
     """Connect a user to a chat for private management"""
-    pool = await get_db()
-    async with pool.acquire() as conn:
+    _invalidate_connection(user_id)
+    async with acquire() as conn:
         await conn.execute("""
             INSERT INTO user_connections (user_id, chat_id, chat_title)
             VALUES ($1, $2, $3)
             ON CONFLICT (user_id)
             DO UPDATE SET chat_id = EXCLUDED.chat_id, chat_title = EXCLUDED.chat_title, updated_at = CURRENT_TIMESTAMP
         """, user_id, chat_id, chat_title)
+    _invalidate_connection(user_id)
+    _connection_cache.set(user_id, {'chat_id': chat_id, 'chat_title': chat_title})
+    await publish_invalidation("connections", user_id)
 
 async def get_user_connected_chat(user_id: int) -> dict | None:
     """Get the chat a user is connected to"""
-    row = await fetch_one("""
-        SELECT chat_id, chat_title FROM user_connections WHERE user_id = $1
-    """, user_id)
-    if row:
-        return {'chat_id': row['chat_id'], 'chat_title': row['chat_title']}
-    return None
+    cached = _connection_cache.get(user_id)
+    if cached is not None:
+        return None if cached is _NO_CONNECTION else cached
+
+    with _connection_generations.load(user_id) as still_current:
+        row = await fetchrow_named(CONNECTION_BY_USER, user_id)
+        connection = {'chat_id': row['chat_id'], 'chat_title': row['chat_title']} if row else None
+
+        if still_current():
+            _connection_cache.set(user_id, connection if connection else _NO_CONNECTION)
+    return connection
 
 async def disconnect_user(user_id: int):
     """Disconnect a user from any chat"""
-    pool = await get_db()
-    async with pool.acquire() as conn:
+    _invalidate_connection(user_id)
+    async with acquire() as conn:
         await conn.execute("""
             DELETE FROM user_connections WHERE user_id = $1
         """, user_id)
+    _invalidate_connection(user_id)
+    _connection_cache.set(user_id, _NO_CONNECTION)
+    await publish_invalidation("connections", user_id)
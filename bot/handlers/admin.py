@@ -1,8 +1,9 @@
 import asyncio
+import logging
 from datetime import datetime, timedelta
 
 from aiogram import Router, Bot, F
-from aiogram.types import Message, ChatPermissions
+from aiogram.types import Message, CallbackQuery, ChatPermissions, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import Command
 from aiogram.exceptions import TelegramBadRequest
 
@@ -11,17 +12,13 @@ from bot.database.settings import (
     get_previous_permissions, clear_previous_permissions
 )
 
-from bot.utils.helpers import is_admin, can_restrict, get_target_user, get_user_link, extract_time, can_delete
-from bot.config import ALLOWED_GROUP_ID
-
-router = Router()
+from bot.utils.helpers import is_admin, can_restrict, get_target_user, get_user_link, extract_time, can_delete, is_allowed_group
+from bot.utils.admin_roster import get_admin_roster
+from bot.utils.purge import PurgeJob, run_purge, claim_purge, cancel_purge
 
+logger = logging.getLogger(__name__)
 
-def is_allowed_group(chat_id: int) -> bool:
-    """Check if bot is allowed to operate in this group"""
-    if ALLOWED_GROUP_ID is None:
-        return True  # No restriction if not configured
-    return chat_id == ALLOWED_GROUP_ID
+router = Router()
 
 
 # Helper function to check admin and delete if not
@@ -478,33 +475,84 @@ async def purge_messages(message: Message, bot: Bot):
     start_id = message.reply_to_message.message_id
     end_id = message.message_id
 
-    deleted = 0
-    message_ids = list(range(start_id, end_id + 1))
+    job = PurgeJob(chat_id, list(range(start_id, end_id + 1)), started_by=user_id)
+    if not claim_purge(job):
+        await message.reply("Bu grupta zaten bir silme islemi devam ediyor!")
+        return
 
-    # Batch delete messages (max 100 per request)
-    for i in range(0, len(message_ids), 100):
-        batch = message_ids[i:i + 100]
-        try:
-            await bot.delete_messages(chat_id, batch)
-            deleted += len(batch)
-        except TelegramBadRequest:
-            # Fallback to single deletion if batch fails
-            for msg_id in batch:
-                try:
-                    await bot.delete_message(chat_id, msg_id)
-                    deleted += 1
-                except Exception:
-                    continue
-        except Exception:
-            continue
-
-    status = await message.answer(f"**{deleted}** mesaj silindi!")
-    await asyncio.sleep(3)
     try:
+        status = await message.answer(
+            f"Mesajlar siliniyor... 0/{job.total}",
+            reply_markup=purge_cancel_keyboard(chat_id)
+        )
+    except Exception:
+        status = None
+
+    # Runs in the background: a purge of thousands of messages takes a while
+    # and the cancel button is handled in the same chat's update queue
+    task = asyncio.create_task(_run_purge_job(bot, job, status))
+    _purge_tasks.add(task)
+    task.add_done_callback(_purge_tasks.discard)
+
+
+# Running purge tasks (kept referenced until they finish)
+_purge_tasks: set[asyncio.Task] = set()
+
+
+def purge_cancel_keyboard(chat_id: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="Iptal", callback_data=f"purge_cancel:{chat_id}")]
+    ])
+
+
+async def _run_purge_job(bot: Bot, job: PurgeJob, status: Message | None):
+    """Run a purge, editing the status message with its progress"""
+
+    async def report(progress: PurgeJob):
+        if status:
+            await status.edit_text(
+                f"Mesajlar siliniyor... {progress.done}/{progress.total}",
+                reply_markup=purge_cancel_keyboard(progress.chat_id)
+            )
+
+    try:
+        await run_purge(bot, job, on_progress=report)
+    except Exception as e:
+        logger.warning(f"Silme islemi basarisiz (chat {job.chat_id}): {e}")
+
+    if job.cancelled:
+        result = f"Silme iptal edildi. **{job.deleted}** mesaj silindi."
+    else:
+        result = f"**{job.deleted}** mesaj silindi!"
+
+    if not status:
+        return
+    try:
+        await status.edit_text(result)
+        await asyncio.sleep(3)
         await status.delete()
     except:
         pass
 
+
+@router.callback_query(F.data.startswith("purge_cancel:"))
+async def purge_cancel_callback(callback_query: CallbackQuery, bot: Bot):
+    """Cancel button under the purge progress message"""
+    try:
+        chat_id = int(callback_query.data.split(":", 1)[1])
+    except ValueError:
+        await callback_query.answer()
+        return
+
+    if not await can_delete(bot, chat_id, callback_query.from_user.id):
+        await callback_query.answer("Bu islem icin yetkiniz yok!", show_alert=True)
+        return
+
+    if cancel_purge(chat_id):
+        await callback_query.answer("Silme iptal ediliyor...")
+    else:
+        await callback_query.answer("Aktif silme islemi yok.")
+
 @router.message(Command("del"))
 async def delete_message(message: Message, bot: Bot):
     if message.chat.type == "private":
@@ -599,8 +647,8 @@ async def list_admins(message: Message, bot: Bot):
     text = "**Grup Adminleri:**\n\n"
 
     try:
-        admins = await bot.get_chat_administrators(chat_id)
-        for member in admins:
+        admins = await get_admin_roster(bot, chat_id)
+        for member in admins.values():
             user = member.user
             if user.is_bot:
                 continue
@@ -1,25 +1,18 @@
 from aiogram import Router, Bot, F
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, ChatMemberUpdated
 from aiogram.filters import Command
 from typing import Callable, Awaitable, Any
 from aiogram.types import TelegramObject
 
-from bot.config import BOT_NAME, BOT_VERSION, ALLOWED_GROUP_ID
-from bot.utils.helpers import is_admin
-from bot.database.settings import connect_user_to_chat, get_user_connected_chat, disconnect_user
+from bot.config import BOT_NAME, BOT_VERSION
+from bot.utils.helpers import is_admin, is_allowed_group, remember_chat, forget_chat
+from bot.utils.admin_roster import apply_chat_member_update, drop_roster, drop_all_rosters
+from bot.database.settings import connect_user_to_chat, get_user_connected_chat, disconnect_user, stop_tag_session
+from bot.database.invalidation import register_cache, publish_invalidation
 
 router = Router()
 
 
-# ==================== YARDIMCI FONKSİYONLAR ====================
-
-def is_allowed_group(chat_id: int) -> bool:
-    """Check if bot is allowed to operate in this group"""
-    if ALLOWED_GROUP_ID is None:
-        return True  # No restriction if not configured
-    return chat_id == ALLOWED_GROUP_ID
-
-
 # ==================== HELP MENU KEYBOARDS ====================
 
 def get_help_main_keyboard() -> InlineKeyboardMarkup:
@@ -92,6 +85,9 @@ async def auto_delete_system_messages_middleware(
     if event.chat.type in ["group", "supergroup"]:
         chat_id = event.chat.id
         if is_allowed_group(chat_id):
+            # Keep the cached chat title current for {chatname}
+            if event.new_chat_title:
+                remember_chat(event.chat.model_copy(update={'title': event.new_chat_title}))
             if is_system_message(event):
                 try:
                     await event.delete()
@@ -101,6 +97,33 @@ async def auto_delete_system_messages_middleware(
     return await handler(event, data)
 
 
+# ==================== ÜYE DURUMU GÜNCELLEMELERİ ====================
+
+# Other replicas drop a chat's roster when its admins change here
+register_cache("roster", drop_roster, drop_all_rosters)
+
+
+@router.chat_member()
+async def chat_member_updated(event: ChatMemberUpdated):
+    """Keep the chat's admin roster in sync with promotions and demotions"""
+    if apply_chat_member_update(event):
+        # Only this replica got the update
+        await publish_invalidation("roster", event.chat.id)
+
+
+@router.my_chat_member()
+async def my_chat_member_updated(event: ChatMemberUpdated):
+    """Bot's own status changed - reload the chat's admin roster on next use"""
+    drop_roster(event.chat.id)
+    await publish_invalidation("roster", event.chat.id)
+    if event.new_chat_member.status in ("left", "kicked"):
+        forget_chat(event.chat.id)
+        # A running session sees it on its next progress update; a stored one is no longer resumed
+        await stop_tag_session(event.chat.id)
+    else:
+        remember_chat(event.chat)
+
+
 # /start command
 @router.message(Command("start"))
 async def start_command(message: Message, bot: Bot):
@@ -8,9 +8,8 @@ from aiogram import Router, Bot, F
 from aiogram.types import Message
 from aiogram.filters import Command
 
-from bot.utils.helpers import is_admin, is_bot_command
+from bot.utils.helpers import is_admin, is_bot_command, is_allowed_group
 from bot.database.settings import get_chat_settings, set_admin_only_mode, get_user_connected_chat
-from bot.config import ALLOWED_GROUP_ID
 
 
 async def get_target_chat_for_command(message, bot) -> tuple:
@@ -34,6 +33,7 @@ async def get_target_chat_for_command(message, bot) -> tuple:
         chat_title = connection['chat_title']
 
         # Verify user is still admin in that group
+        # (served from the in-memory admin roster, not a live API call)
         if not await is_admin(bot, chat_id, user_id):
             return None, None, False, (
                 f"**{chat_title}** grubunda artik admin degilsiniz!\n"
@@ -48,13 +48,6 @@ async def get_target_chat_for_command(message, bot) -> tuple:
 router = Router()
 
 
-def is_allowed_group(chat_id: int) -> bool:
-    """Check if bot is allowed to operate in this group"""
-    if ALLOWED_GROUP_ID is None:
-        return True  # No restriction if not configured
-    return chat_id == ALLOWED_GROUP_ID
-
-
 # This middleware checks bot commands only
 @router.message(F.chat.type.in_(["group", "supergroup"]), F.text.startswith("/"))
 async def command_guard(message: Message, bot: Bot):
@@ -70,25 +63,13 @@ async def command_guard(message: Message, bot: Bot):
     if not message.from_user:
         return
 
-    text = message.text.strip()
-
-    # Check if it's one of our bot commands
-    if not is_bot_command(text):
+    # Check if it's one of our bot commands (only the leading token is parsed)
+    if not is_bot_command(message.text):
         return  # Not our command, let it pass
 
     chat_id = message.chat.id
     user_id = message.from_user.id
 
-    # Check if allowed group
-    if not is_allowed_group(chat_id):
-        # Silently ignore commands in non-allowed groups
-        try:
-            await message.delete()
-        except:
-            pass
-        # Don't block - let other handlers decide
-        return
-
     # Check if user is admin
     user_is_admin = await is_admin(bot, chat_id, user_id)
 
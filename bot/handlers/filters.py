@@ -8,11 +8,8 @@ from bot.database.filters import (
     add_filter, get_filter, get_all_filters,
     delete_filter, delete_all_filters, check_filters
 )
-from bot.utils.helpers import (
-    is_admin, process_filter_response, parse_buttons, parse_buttons_raw,
-    build_keyboard, apply_fillings, parse_random_content
-)
-from bot.config import ALLOWED_GROUP_ID
+from bot.utils.helpers import is_admin, is_allowed_group, parse_buttons_raw, get_chat_cached
+from bot.utils.filter_reply import FilterReply
 from bot.database.settings import get_user_connected_chat
 
 router = Router()
@@ -39,6 +36,7 @@ async def get_target_chat(message: Message, bot: Bot) -> tuple:
         chat_title = connection['chat_title']
 
         # Verify user is still admin in that group
+        # (served from the in-memory admin roster, not a live API call)
         if not await is_admin(bot, chat_id, user_id):
             return None, None, False, (
                 f"**{chat_title}** grubunda artik admin degilsiniz!\n"
@@ -51,13 +49,6 @@ async def get_target_chat(message: Message, bot: Bot) -> tuple:
         return message.chat.id, message.chat.title, False, None
 
 
-def is_allowed_group(chat_id: int) -> bool:
-    """Check if bot is allowed to operate in this group"""
-    if ALLOWED_GROUP_ID is None:
-        return True  # No restriction if not configured
-    return chat_id == ALLOWED_GROUP_ID
-
-
 def parse_filter_keywords(text: str) -> list:
     """Parse filter keywords from command text"""
     keywords = []
@@ -411,35 +402,24 @@ async def send_filter_response(message: Message, bot: Bot, filter_data: dict, ch
     """Send filter response with proper formatting"""
     user = message.from_user
 
-    # Get chat info for fillings
-    try:
-        chat = await bot.get_chat(chat_id)
-    except:
-        chat = message.chat
+    # Filters from the index carry a pre-rendered reply, others are compiled here
+    reply = filter_data.get('reply') or FilterReply.from_filter(filter_data)
 
-    response = filter_data.get('response')
-    media_type = filter_data.get('media_type')
-    file_id = filter_data.get('file_id')
-    buttons = filter_data.get('buttons')
-    caption = filter_data.get('caption')
-
-    # Build keyboard from buttons
-    keyboard = None
-    if buttons:
-        keyboard = build_keyboard(buttons)
-
-    # Process response with fillings, random content, and buttons
-    if response:
-        processed_response, text_keyboard = process_filter_response(response, user, chat)
-        if text_keyboard and not keyboard:
-            keyboard = text_keyboard
-        response = processed_response
-
-    if caption:
-        processed_caption, caption_keyboard = process_filter_response(caption, user, chat)
-        if caption_keyboard and not keyboard:
-            keyboard = caption_keyboard
-        caption = processed_caption
+    # Chat info is only needed for {chatname}; the message's own chat is used
+    # when possible, connected chats come from the chat info cache
+    chat = None
+    if 'chatname' in reply.fillings:
+        chat = message.chat
+        if message.chat.id != chat_id:
+            try:
+                chat = await get_chat_cached(bot, chat_id)
+            except:
+                chat = None  # Falls back to "Grup"
+    media_type = reply.media_type
+    file_id = reply.file_id
+
+    # Random content, fillings and buttons
+    response, caption, keyboard = reply.render(user, chat)
 
     try:
         if media_type and file_id:
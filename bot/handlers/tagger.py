@@ -1,21 +1,29 @@
 import asyncio
+import logging
+import os
 import random
+import socket
+import uuid
 from aiogram import Router, Bot, F
 from aiogram.types import Message
 from aiogram.filters import Command
-from aiogram.exceptions import TelegramRetryAfter, TelegramBadRequest
+from aiogram.exceptions import TelegramRetryAfter, TelegramBadRequest, TelegramForbiddenError
 
 from bot.database.members import (
-    save_members_bulk, get_all_members, get_members_count,
-    get_members_batch, delete_all_members, save_member
+    save_members_bulk, iter_members, get_members_count,
+    delete_all_members, queue_member
 )
 from bot.database.settings import (
-    start_tag_session, get_tag_session, update_tag_index, stop_tag_session
+    start_tag_session, get_tag_session, update_tag_index, stop_tag_session,
+    claim_tag_sessions, renew_tag_leases, release_tag_leases
 )
-from bot.utils.helpers import is_admin, get_user_mention
-from bot.config import ALLOWED_GROUP_ID
+from bot.utils.helpers import is_admin, is_allowed_group, get_cached_mention
+from bot.utils.markdown import escape_markdown_v2
+from bot.utils.admin_roster import get_admin_roster
+from bot.utils.rate_limiter import bulk_traffic
 
 router = Router()
+logger = logging.getLogger(__name__)
 
 # Telegram service/system account IDs that should NOT be saved as members
 # 777000 = Telegram's official notification/verification account
@@ -38,11 +46,16 @@ RANDOM_QUESTIONS = [
 ]
 
 
-def is_allowed_group(chat_id: int) -> bool:
-    """Check if bot is allowed to operate in this group"""
-    if ALLOWED_GROUP_ID is None:
-        return True  # No restriction if not configured
-    return chat_id == ALLOWED_GROUP_ID
+async def iter_member_chunks(chat_id: int, size: int, after_id: int = 0):
+    """Stream saved members as lists of at most `size` rows"""
+    chunk = []
+    async for member in iter_members(chat_id, after_id=after_id):
+        chunk.append(member)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
 
 
 # /kaydet - Save all group members to database
@@ -73,11 +86,11 @@ async def save_all_members(message: Message, bot: Bot):
 
     members_list = []
     try:
-        # In aiogram, we need to use get_chat_administrators and iterate
+        # Admins come from the chat's admin roster (one get_chat_administrators call)
         # Note: Bot API doesn't support getting all members, only admins
         # We'll save admins and track members as they send messages
-        admins = await bot.get_chat_administrators(chat_id)
-        for member in admins:
+        admins = await get_admin_roster(bot, chat_id)
+        for member in admins.values():
             # Skip bots and Telegram service accounts (777000, Channel_Bot, etc.)
             if member.user and not member.user.is_bot:
                 if member.user.id not in TELEGRAM_SERVICE_IDS:
@@ -183,28 +196,29 @@ async def naber_tag(message: Message, bot: Bot):
             pass
         return
 
-    members = await get_all_members(chat_id)
+    total = await get_members_count(chat_id)
 
-    if not members:
+    if not total:
         await message.reply("Kayitli uye yok! Once `/kaydet` komutunu kullanin.")
         return
 
-    await message.reply(f"**{len(members)}** kisi etiketlenecek...")
+    await message.reply(f"**{total}** kisi etiketlenecek...")
+
+    # Runs in the background so the chat's later updates (e.g. /durdur) aren't held up
+    spawn_broadcast(_run_naber(bot, chat_id))
 
-    for member in members:
-        try:
-            mention = get_user_mention(member['user_id'], member.get('username'), member.get('first_name'))
-            question = random.choice(RANDOM_QUESTIONS)
-            # Escape question for MarkdownV2 - backslash MUST be first
-            question = question.replace('\\', '\\\\')
-            for char in ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!', '?']:
-                question = question.replace(char, f'\\{char}')
-            await bot.send_message(chat_id, f"{mention} {question}", parse_mode="MarkdownV2")
-            await asyncio.sleep(1)  # Anti-flood
-        except TelegramRetryAfter as e:
-            await asyncio.sleep(e.retry_after)
-        except Exception:
-            continue
+
+async def _run_naber(bot: Bot, chat_id: int):
+    """Send one random question per member"""
+    # Pacing and flood-wait retries are handled by the outbound rate limiter
+    with bulk_traffic():
+        async for member in iter_members(chat_id):
+            try:
+                mention = get_cached_mention(chat_id, member['user_id'], member['username'], member['first_name'])
+                question = escape_markdown_v2(random.choice(RANDOM_QUESTIONS))
+                await bot.send_message(chat_id, f"{mention} {question}", parse_mode="MarkdownV2")
+            except Exception:
+                continue
 
     await bot.send_message(chat_id, "Etiketleme tamamlandı!")
 
@@ -246,50 +260,16 @@ async def start_tagging(message: Message, bot: Bot):
 
     custom_message = args[1]
 
-    members = await get_all_members(chat_id)
-    if not members:
+    total = await get_members_count(chat_id)
+    if not total:
         await message.reply("Kayitli uye yok! Once `/kaydet` komutunu kullanin.")
         return
 
-    # Start tag session
-    await start_tag_session(chat_id, custom_message, user_id)
-
-    await message.reply(f"Etiketleme başladı! **{len(members)}** kişi etiketlenecek.\nDurdurmak için: `/durdur`")
+    # Start tag session - the scheduler picks it up and runs it in the background
+    run_id = await start_tag_session(chat_id, custom_message, user_id, TAG_OWNER)
+    enqueue_tag_session(chat_id, run_id)
 
-    # Tag 5 people at a time
-    total = len(members)
-    index = 0
-
-    while index < total:
-        # Check if session is still active
-        session = await get_tag_session(chat_id)
-        if not session or not session['is_active']:
-            await bot.send_message(chat_id, "Etiketleme durduruldu.")
-            return
-
-        batch = members[index:index + 5]
-        mentions = []
-        for member in batch:
-            mention = get_user_mention(member['user_id'], member.get('username'), member.get('first_name'))
-            mentions.append(mention)
-
-        try:
-            # Escape custom message for MarkdownV2 - backslash MUST be first
-            escaped_message = custom_message.replace('\\', '\\\\')
-            for char in ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']:
-                escaped_message = escaped_message.replace(char, f'\\{char}')
-            tag_text = f"{escaped_message}\n\n" + " ".join(mentions)
-            await bot.send_message(chat_id, tag_text, parse_mode="MarkdownV2")
-            index += 5
-            await update_tag_index(chat_id, index)
-            await asyncio.sleep(3)  # Anti-flood
-        except TelegramRetryAfter as e:
-            await asyncio.sleep(e.retry_after)
-        except Exception:
-            continue
-
-    await stop_tag_session(chat_id)
-    await bot.send_message(chat_id, f"Etiketleme tamamlandı! **{total}** kişi etiketlendi.")
+    await message.reply(f"Etiketleme başladı! **{total}** kişi etiketlenecek.\nDurdurmak için: `/durdur`")
 
 
 # /durdur - Stop ongoing tagging
@@ -314,9 +294,16 @@ async def stop_tagging(message: Message, bot: Bot):
             pass
         return
 
+    # Session running in this process - signal it directly
+    if signal_tag_stop(chat_id):
+        await stop_tag_session(chat_id, notify=True)
+        await message.reply("Etiketleme durduruldu!")
+        return
+
+    # Otherwise it may be running in another replica
     session = await get_tag_session(chat_id)
     if session and session['is_active']:
-        await stop_tag_session(chat_id)
+        await stop_tag_session(chat_id, notify=True)
         await message.reply("Etiketleme durduruldu!")
     else:
         await message.reply("Aktif etiketleme islemi yok.")
@@ -348,35 +335,231 @@ async def tag_everyone(message: Message, bot: Bot):
     args = text.split(None, 1)
     custom_message = args[1] if len(args) > 1 else "Duyuru!"
 
-    members = await get_all_members(chat_id)
-    if not members:
+    if not await get_members_count(chat_id):
         await message.reply("Kayitli uye yok! Once `/kaydet` komutunu kullanin.")
         return
 
-    # Create mention list in chunks of 50 (Telegram limit)
-    chunk_size = 50
-    for i in range(0, len(members), chunk_size):
-        chunk = members[i:i + chunk_size]
-        mentions = []
-        for member in chunk:
-            mention = get_user_mention(member['user_id'], member.get('username'), member.get('first_name'))
-            mentions.append(mention)
+    # Runs in the background so the chat's later updates aren't held up
+    spawn_broadcast(_run_herkes(bot, chat_id, escape_markdown_v2(custom_message)))
 
-        try:
-            if i == 0:
-                # Escape custom message for MarkdownV2 - backslash MUST be first
-                escaped_message = custom_message.replace('\\', '\\\\')
-                for char in ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']:
-                    escaped_message = escaped_message.replace(char, f'\\{char}')
+
+async def _run_herkes(bot: Bot, chat_id: int, escaped_message: str):
+    """Mention every member, 50 per message"""
+    # Create mention list in chunks of 50 (Telegram limit)
+    # Pacing and flood-wait retries are handled by the outbound rate limiter
+    first_chunk = True
+    with bulk_traffic():
+        async for chunk in iter_member_chunks(chat_id, 50):
+            mentions = []
+            for member in chunk:
+                mention = get_cached_mention(chat_id, member['user_id'], member['username'], member['first_name'])
+                mentions.append(mention)
+
+            if first_chunk:
                 tag_text = f"*{escaped_message}*\n\n" + " ".join(mentions)
+                first_chunk = False
             else:
                 tag_text = " ".join(mentions)
-            await bot.send_message(chat_id, tag_text, parse_mode="MarkdownV2")
-            await asyncio.sleep(2)
-        except TelegramRetryAfter as e:
-            await asyncio.sleep(e.retry_after)
+
+            try:
+                await bot.send_message(chat_id, tag_text, parse_mode="MarkdownV2")
+            except Exception:
+                continue
+
+
+# ==================== TAG SESSION SCHEDULER ====================
+
+# Members mentioned per tag message
+TAG_BATCH_SIZE = 5
+
+# Identifies this process in active_tags.owner; a session is only run by
+# the process holding its lease
+TAG_OWNER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# Seconds between lease renewals / claims of orphaned sessions
+# (well below TAG_LEASE_SECONDS)
+TAG_LEASE_RENEW_INTERVAL = 30
+
+# chat_id -> task running that chat's tag session
+_tag_tasks: dict[int, asyncio.Task] = {}
+
+# Running /naber and /herkes broadcasts (kept referenced until they finish)
+_broadcast_tasks: set[asyncio.Task] = set()
+
+# chat_id -> stop signal of the running session, set by /durdur
+# (active_tags only keeps the persistent record)
+_tag_stop_events: dict[int, asyncio.Event] = {}
+
+# (chat_id, run_id) of sessions (re)started by a handler that should be run
+_tag_queue: asyncio.Queue | None = None
+
+
+def _get_tag_queue() -> asyncio.Queue:
+    global _tag_queue
+    if _tag_queue is None:
+        _tag_queue = asyncio.Queue()
+    return _tag_queue
+
+
+def spawn_broadcast(coro) -> asyncio.Task:
+    """Run a one-off broadcast outside the update handler"""
+    task = asyncio.create_task(coro)
+    _broadcast_tasks.add(task)
+    task.add_done_callback(_broadcast_tasks.discard)
+    return task
+
+
+def enqueue_tag_session(chat_id: int, run_id: int):
+    """Ask the scheduler to run the tag session started with run_id"""
+    _get_tag_queue().put_nowait((chat_id, run_id))
+
+
+def signal_tag_stop(chat_id: int) -> bool:
+    """Stop the session running in this process, returns False if there is none"""
+    stop_event = _tag_stop_events.get(chat_id)
+    if stop_event is None:
+        return False
+    stop_event.set()
+    return True
+
+
+def on_tag_stop_notify(payload: str):
+    """Stop signal received from another process over LISTEN/NOTIFY (TAG_STOP_CHANNEL)"""
+    if payload.lstrip('-').isdigit():
+        signal_tag_stop(int(payload))
+
+
+def _launch_tag_session(bot: Bot, chat_id: int, run_id: int, resumed: bool = False):
+    """Start a session task, replacing any task still running for the chat
+
+    The replaced task can't touch the new session's cursor even if it is
+    still writing: its progress updates carry the old run_id.
+    """
+    old_task = _tag_tasks.get(chat_id)
+    if old_task and not old_task.done():
+        old_task.cancel()
+
+    stop_event = asyncio.Event()
+    task = asyncio.create_task(_run_tag_session(bot, chat_id, run_id, stop_event, resumed))
+    _tag_tasks[chat_id] = task
+    _tag_stop_events[chat_id] = stop_event
+
+    def _cleanup(finished: asyncio.Task):
+        if _tag_tasks.get(chat_id) is finished:
+            del _tag_tasks[chat_id]
+            del _tag_stop_events[chat_id]
+
+    task.add_done_callback(_cleanup)
+
+
+async def _maintain_tag_leases(bot: Bot):
+    """Renew the leases of our sessions and start the ones nobody owns any more"""
+    try:
+        if _tag_tasks:
+            await renew_tag_leases(TAG_OWNER, list(_tag_tasks))
+        sessions = await claim_tag_sessions(TAG_OWNER)
+    except Exception as e:
+        logger.warning(f"Etiketleme oturumu kiralari yenilenemedi: {e}")
+        return
+
+    for session in sessions:
+        _launch_tag_session(bot, session['chat_id'], session['run_id'], resumed=True)
+    if sessions:
+        logger.info(f"{len(sessions)} etiketleme oturumu devam ettiriliyor")
+
+
+async def run_tag_scheduler(bot: Bot):
+    """Background task running tag sessions of all chats concurrently
+
+    Sessions still marked active in active_tags are resumed from their saved
+    cursor once their lease is free: on startup, and later when the replica
+    running them stops renewing it. Sessions queued by /etiket are started
+    as they come.
+    """
+    queue = _get_tag_queue()
+    loop = asyncio.get_running_loop()
+    try:
+        next_renewal = loop.time()
+        while True:
+            if loop.time() >= next_renewal:
+                await _maintain_tag_leases(bot)
+                next_renewal = loop.time() + TAG_LEASE_RENEW_INTERVAL
+
+            try:
+                chat_id, run_id = await asyncio.wait_for(queue.get(), next_renewal - loop.time())
+            except asyncio.TimeoutError:
+                continue
+            _launch_tag_session(bot, chat_id, run_id)
+    finally:
+        for task in list(_tag_tasks.values()) + list(_broadcast_tasks):
+            task.cancel()
+        # Sessions stay active in the database; releasing the leases lets
+        # another replica (or the next start) resume them right away
+        try:
+            await release_tag_leases(TAG_OWNER)
         except Exception:
-            continue
+            pass
+
+
+def _is_chat_gone(error: Exception) -> bool:
+    """Errors after which the chat can never be tagged again (bot removed, chat deleted)"""
+    if isinstance(error, TelegramForbiddenError):
+        return True
+    return isinstance(error, TelegramBadRequest) and "chat not found" in str(error).lower()
+
+
+async def _run_tag_session(bot: Bot, chat_id: int, run_id: int, stop_event: asyncio.Event, resumed: bool):
+    """Tag members 5 at a time, saving progress after every batch"""
+    try:
+        session = await get_tag_session(chat_id)
+        # Stopped, or already replaced by a newer /etiket
+        if not session or session['run_id'] != run_id:
+            return
+
+        index = session['current_index'] or 0
+        last_member_id = session.get('last_member_id') or 0
+
+        escaped_message = escape_markdown_v2(session['message'] or "")
+
+        if resumed and index:
+            await bot.send_message(chat_id, f"Etiketleme kaldigi yerden devam ediyor (**{index}** kisi etiketlendi).")
+
+        # Sends are paced per chat by the outbound rate limiter, behind interactive replies
+        with bulk_traffic():
+            async for batch in iter_member_chunks(chat_id, TAG_BATCH_SIZE, after_id=last_member_id):
+                # Stopped by /durdur
+                if stop_event.is_set():
+                    await bot.send_message(chat_id, "Etiketleme durduruldu.")
+                    return
+
+                mentions = []
+                for member in batch:
+                    mention = get_cached_mention(chat_id, member['user_id'], member['username'], member['first_name'])
+                    mentions.append(mention)
+                tag_text = f"{escaped_message}\n\n" + " ".join(mentions)
+
+                try:
+                    await bot.send_message(chat_id, tag_text, parse_mode="MarkdownV2")
+                except Exception as e:
+                    if _is_chat_gone(e):
+                        raise
+
+                index += len(batch)
+                if not await update_tag_index(chat_id, run_id, TAG_OWNER, index, batch[-1]['id']):
+                    # Stopped, replaced by a newer /etiket or taken over by another replica
+                    return
+
+        await stop_tag_session(chat_id, run_id=run_id)
+        await bot.send_message(chat_id, f"Etiketleme tamamlandı! **{index}** kişi etiketlendi.")
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        if _is_chat_gone(e):
+            # Otherwise the session stays active and is reclaimed and relaunched forever
+            logger.info(f"Etiketleme oturumu kapatildi, gruba erisim yok ({chat_id}): {e}")
+            await stop_tag_session(chat_id, run_id=run_id)
+            return
+        logger.warning(f"Etiketleme oturumu hatasi ({chat_id}): {e}")
 
 
 # Middleware to auto-save member when they send a message
@@ -402,15 +585,13 @@ async def auto_save_member_middleware(
                 return await handler(event, data)
 
             if is_allowed_group(chat_id):
-                try:
-                    await save_member(
-                        chat_id=chat_id,
-                        user_id=user_id,
-                        username=event.from_user.username,
-                        first_name=event.from_user.first_name
-                    )
-                except Exception:
-                    pass  # Silently ignore errors
+                # Buffered write-behind - flushed in bulk by run_member_flusher
+                queue_member(
+                    chat_id=chat_id,
+                    user_id=user_id,
+                    username=event.from_user.username,
+                    first_name=event.from_user.first_name
+                )
 
     # Always continue to the next handler
     return await handler(event, data)
@@ -0,0 +1,138 @@
+"""
+Admin Roster
+Per-chat in-memory list of administrators, loaded with get_chat_administrators.
+
+- One API call per chat loads every admin together with their rights
+- chat_member updates are applied to the loaded roster as they arrive
+- A background task reloads the rosters periodically, in case an update
+  was missed (e.g. while the bot was offline)
+- With MULTI_INSTANCE, the replica that received the update tells the
+  others to reload the chat's roster
+- Permission checks are dict lookups once a chat's roster is loaded
+"""
+
+import asyncio
+import logging
+import time
+
+from aiogram import Bot
+from aiogram.types import ChatMemberUpdated
+
+from bot.utils.cache import Generations
+
+logger = logging.getLogger(__name__)
+
+# Seconds between scheduled reloads of every loaded roster
+ROSTER_REFRESH_INTERVAL = 600
+# A roster older than this is reloaded on access (if the refresher fell behind)
+ROSTER_MAX_AGE = 2 * ROSTER_REFRESH_INTERVAL
+# Rosters of chats that saw no permission check for this long are dropped
+ROSTER_IDLE_TTL = 24 * 3600
+
+ADMIN_STATUSES = ("creator", "administrator")
+
+# chat_id -> {user_id: ChatMemberOwner | ChatMemberAdministrator}, in Telegram's order
+_rosters: dict[int, dict] = {}
+
+# chat_id -> monotonic time of the last load / last lookup
+_loaded_at: dict[int, float] = {}
+_used_at: dict[int, float] = {}
+
+# chat_id -> in-flight get_chat_administrators task, shared by concurrent lookups
+_load_tasks: dict[int, asyncio.Task] = {}
+
+# So a load that raced with a chat_member update never stores a stale roster
+_roster_generations = Generations()
+
+
+async def _load_roster(bot: Bot, chat_id: int) -> dict:
+    with _roster_generations.load(chat_id) as still_current:
+        admins = await bot.get_chat_administrators(chat_id)
+        roster = {member.user.id: member for member in admins}
+
+        # Only publish the roster if no chat_member update arrived meanwhile
+        if still_current():
+            _rosters[chat_id] = roster
+            _loaded_at[chat_id] = time.monotonic()
+    return roster
+
+
+async def refresh_roster(bot: Bot, chat_id: int) -> dict:
+    """(Re)load a chat's roster, concurrent callers share one API call"""
+    task = _load_tasks.get(chat_id)
+    if task is None:
+        task = asyncio.ensure_future(_load_roster(bot, chat_id))
+        _load_tasks[chat_id] = task
+        task.add_done_callback(lambda _: _load_tasks.pop(chat_id, None))
+    return await task
+
+
+async def get_admin_roster(bot: Bot, chat_id: int) -> dict:
+    """Return {user_id: ChatMember} of the chat's administrators"""
+    _used_at[chat_id] = time.monotonic()
+    roster = _rosters.get(chat_id)
+    if roster is not None and time.monotonic() - _loaded_at[chat_id] < ROSTER_MAX_AGE:
+        return roster
+    return await refresh_roster(bot, chat_id)
+
+
+async def get_admin(bot: Bot, chat_id: int, user_id: int):
+    """The user's ChatMemberOwner/ChatMemberAdministrator, None if not an admin"""
+    roster = await get_admin_roster(bot, chat_id)
+    return roster.get(user_id)
+
+
+def apply_chat_member_update(event: ChatMemberUpdated) -> bool:
+    """Apply a chat_member update (promotion, demotion, rights change, leave)
+
+    Returns True if the update concerned an admin.
+    """
+    member = event.new_chat_member
+    # Regular members joining or leaving don't touch the roster
+    if member.status not in ADMIN_STATUSES and event.old_chat_member.status not in ADMIN_STATUSES:
+        return False
+
+    chat_id = event.chat.id
+    _roster_generations.invalidate(chat_id)
+
+    roster = _rosters.get(chat_id)
+    if roster is None:
+        return True
+
+    if member.status in ADMIN_STATUSES:
+        roster[member.user.id] = member
+    else:
+        roster.pop(member.user.id, None)
+    return True
+
+
+def drop_roster(chat_id: int):
+    """Forget a chat's roster, it is reloaded on the next lookup"""
+    _roster_generations.invalidate(chat_id)
+    _rosters.pop(chat_id, None)
+    _loaded_at.pop(chat_id, None)
+
+
+def drop_all_rosters():
+    """Forget every chat's roster"""
+    _roster_generations.invalidate_all()
+    _rosters.clear()
+    _loaded_at.clear()
+
+
+async def run_roster_refresher(bot: Bot):
+    """Background task reloading every loaded roster on a schedule"""
+    while True:
+        await asyncio.sleep(ROSTER_REFRESH_INTERVAL)
+        now = time.monotonic()
+        for chat_id in list(_rosters):
+            if now - _used_at.get(chat_id, 0) > ROSTER_IDLE_TTL:
+                drop_roster(chat_id)
+                _used_at.pop(chat_id, None)
+                continue
+            try:
+                await refresh_roster(bot, chat_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Admin listesi yenilenemedi (chat {chat_id}): {e}")
@@ -0,0 +1,93 @@
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class TTLCache:
+    """Size-bounded LRU cache whose entries expire after ``ttl`` seconds"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        """Return a fresh value for key (and mark it recently used), else default"""
+        item = self._data.get(key)
+        if item is None:
+            return default
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl: float | None = None):
+        """Store a value, evicting the least recently used entry when full"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """Remove a key and return its value (expired or not)"""
+        item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def discard_where(self, predicate):
+        """Remove every entry whose key matches predicate"""
+        for key in [k for k in self._data if predicate(k)]:
+            del self._data[key]
+
+    def clear(self):
+        self._data.clear()
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class Generations:
+    """Per-key invalidation counters guarding read-through loads
+
+    A load that raced with an invalidation of its key must not store what it
+    read. Counters only exist while a load of the key is in flight, so the
+    table never outgrows the number of concurrent loads.
+    """
+
+    def __init__(self):
+        # key -> [invalidation counter, loads in flight]
+        self._loads = {}
+
+    @contextmanager
+    def load(self, key):
+        """Track a load of key; yields a callable telling whether it may still be stored"""
+        entry = self._loads.setdefault(key, [0, 0])
+        entry[1] += 1
+        generation = entry[0]
+        try:
+            yield lambda: entry[0] == generation
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._loads[key]
+
+    def invalidate(self, key):
+        """Keep loads of key that are in flight from storing their result"""
+        entry = self._loads.get(key)
+        if entry is not None:
+            entry[0] += 1
+
+    def invalidate_all(self):
+        for entry in self._loads.values():
+            entry[0] += 1
+
+    def __len__(self) -> int:
+        return len(self._loads)
+
+
+_MISSING = object()
@@ -0,0 +1,69 @@
+"""
+Filter Replies
+Pre-rendered reply payloads stored next to the in-memory filter index.
+
+Everything that only depends on the filter itself is done once, when the
+chat's filter index is built:
+- stored buttons are compiled into a keyboard (prebuilt when they use no
+  fillings)
+- response and caption are compiled (see bot/utils/templates.py)
+
+Sending a filter then only has to pick an option and join the tokens.
+"""
+
+from dataclasses import dataclass
+
+from bot.utils.templates import (
+    CompiledResponse, KeyboardTemplate, compile_keyboard, compile_response, filling_values
+)
+
+
+@dataclass(frozen=True, slots=True)
+class FilterReply:
+    """Immutable, ready-to-send form of one filter"""
+    media_type: str | None
+    file_id: str | None
+    keyboard: KeyboardTemplate | None
+    response: CompiledResponse | None
+    caption: CompiledResponse | None
+    fillings: frozenset
+
+    @classmethod
+    def from_filter(cls, filter_data: dict) -> "FilterReply":
+        response = filter_data.get('response')
+        caption = filter_data.get('caption')
+        response = compile_response(response) if response else None
+        caption = compile_response(caption) if caption else None
+        keyboard = compile_keyboard(filter_data.get('buttons'))
+        return cls(
+            media_type=filter_data.get('media_type'),
+            file_id=filter_data.get('file_id'),
+            keyboard=keyboard,
+            response=response,
+            caption=caption,
+            fillings=frozenset().union(*(t.fillings for t in (keyboard, response, caption) if t)),
+        )
+
+    def render(self, user, chat=None) -> tuple:
+        """Pick the random options and apply fillings
+
+        Returns:
+            tuple: (response, caption, keyboard) with the same precedence as
+            before: stored buttons, then response buttons, then caption buttons
+        """
+        values = filling_values(user, chat, self.fillings) if self.fillings else None
+        keyboard = self.keyboard
+
+        response = None
+        if self.response:
+            option = self.response.choose()
+            response = option.render(values).strip()
+            keyboard = keyboard or option.keyboard
+
+        caption = None
+        if self.caption:
+            option = self.caption.choose()
+            caption = option.render(values).strip()
+            keyboard = keyboard or option.keyboard
+
+        return response, caption, keyboard.render(values) if keyboard else None
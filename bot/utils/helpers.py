@@ -1,56 +1,50 @@
 import re
-import random
-from aiogram import Bot
-from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, ChatMemberAdministrator, ChatMemberOwner
+from aiogram import Bot, Router
+from aiogram.filters import Command
+from typing import Callable, Awaitable, Any
+from aiogram.types import TelegramObject, Message, InlineKeyboardMarkup, InlineKeyboardButton, ChatMemberAdministrator, ChatMemberOwner
 
-from bot.config import ALLOWED_GROUP_ID
+from bot.config import ALLOWED_GROUP_IDS
+from bot.utils.admin_roster import get_admin
+from bot.utils.cache import TTLCache
+from bot.utils.markdown import mention_markdown_v2
 
-def escape_markdown_v2(text: str) -> str:
-    """Escape special characters for MarkdownV2 parse mode
-
-    Note: Backslash must be escaped FIRST to avoid double-escaping other characters
-    """
-    if not text:
-        return text
-
-    # Backslash MUST be first to avoid double-escaping
-    text = text.replace('\\', '\\\\')
+def is_allowed_group(chat_id: int) -> bool:
+    """Check if bot is allowed to operate in this group"""
+    if not ALLOWED_GROUP_IDS:
+        return True  # No restriction if not configured
+    return chat_id in ALLOWED_GROUP_IDS
 
-    # Then escape other special characters
-    special_chars = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
-    for char in special_chars:
-        text = text.replace(char, f'\\{char}')
-    return text
 
-def escape_markdown(text: str) -> str:
-    """Escape special characters for Markdown parse mode (not V2)"""
-    if not text:
-        return text
+async def allowed_chats_middleware(
+    handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+    event: TelegramObject,
+    data: dict[str, Any]
+) -> Any:
+    """Dispatcher-level outer middleware dropping updates from non-allowed groups
 
-    # Markdown special characters that need escaping
-    special_chars = ['_', '*', '[', ']', '(', ')', '~', '`']
-    for char in special_chars:
-        text = text.replace(char, f'\\{char}')
-    return text
+    Runs before any router, so nothing is done for chats the bot doesn't serve.
+    Private chats and updates without a chat always pass.
+    """
+    chat = data.get("event_chat")
+    if chat is not None and chat.type != "private" and not is_allowed_group(chat.id):
+        return None
+    return await handler(event, data)
 
-def is_allowed_group(chat_id: int) -> bool:
-    """Check if bot is allowed to operate in this group"""
-    if ALLOWED_GROUP_ID is None:
-        return True  # No restriction if not configured
-    return chat_id == ALLOWED_GROUP_ID
+# ==================== PERMISSION CHECKS ====================
+# Answered from the per-chat admin roster (bot/utils/admin_roster.py)
 
 async def is_admin(bot: Bot, chat_id: int, user_id: int) -> bool:
     """Check if user is admin in the chat"""
     try:
-        member = await bot.get_chat_member(chat_id, user_id)
-        return isinstance(member, (ChatMemberAdministrator, ChatMemberOwner))
+        return await get_admin(bot, chat_id, user_id) is not None
     except Exception:
         return False
 
 async def is_owner(bot: Bot, chat_id: int, user_id: int) -> bool:
     """Check if user is owner of the chat"""
     try:
-        member = await bot.get_chat_member(chat_id, user_id)
+        member = await get_admin(bot, chat_id, user_id)
         return isinstance(member, ChatMemberOwner)
     except Exception:
         return False
@@ -58,7 +52,7 @@ async def is_owner(bot: Bot, chat_id: int, user_id: int) -> bool:
 async def can_restrict(bot: Bot, chat_id: int, user_id: int) -> bool:
     """Check if user can restrict members"""
     try:
-        member = await bot.get_chat_member(chat_id, user_id)
+        member = await get_admin(bot, chat_id, user_id)
         if isinstance(member, ChatMemberOwner):
             return True
         if isinstance(member, ChatMemberAdministrator):
@@ -70,7 +64,7 @@ async def can_restrict(bot: Bot, chat_id: int, user_id: int) -> bool:
 async def can_delete(bot: Bot, chat_id: int, user_id: int) -> bool:
     """Check if user can delete messages"""
     try:
-        member = await bot.get_chat_member(chat_id, user_id)
+        member = await get_admin(bot, chat_id, user_id)
         if isinstance(member, ChatMemberOwner):
             return True
         if isinstance(member, ChatMemberAdministrator):
@@ -102,14 +96,74 @@ def get_user_mention(user_id: int, username: str = None, first_name: str = None)
         # Fallback: use "Üye"
         name = "Üye"
 
-    # Escape MarkdownV2 special characters in the name
-    # Backslash MUST be first to avoid double-escaping
-    name = name.replace('\\', '\\\\')
-    for char in ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']:
-        name = name.replace(char, f'\\{char}')
-
     # Return MarkdownV2 format mention - HER ZAMAN bu format kullanılır
-    return f"[{name}](tg://user?id={user_id})"
+    return mention_markdown_v2(user_id, name)
+
+# ==================== CHAT INFO CACHE ====================
+
+# How long a chat's metadata (title, ...) is trusted before asking Telegram again
+CHAT_CACHE_TTL = 3600
+
+# chat_id -> Chat, refreshed from new_chat_title and my_chat_member updates
+_chat_cache = TTLCache(maxsize=1000, ttl=CHAT_CACHE_TTL)
+
+
+def remember_chat(chat):
+    """Store up-to-date chat metadata received in an update"""
+    _chat_cache.set(chat.id, chat)
+
+
+def forget_chat(chat_id: int):
+    """Drop a chat's cached metadata"""
+    _chat_cache.pop(chat_id)
+
+
+async def get_chat_cached(bot: Bot, chat_id: int):
+    """bot.get_chat backed by the chat info cache"""
+    chat = _chat_cache.get(chat_id)
+    if chat is None:
+        chat = await bot.get_chat(chat_id)
+        _chat_cache.set(chat_id, chat)
+    return chat
+
+# ==================== MENTION CACHE ====================
+
+# Rendered mentions are kept for this many chats, each chat for MENTION_CACHE_TTL seconds
+MENTION_CACHE_CHATS = 200
+MENTION_CACHE_TTL = 6 * 3600
+
+# chat_id -> {user_id: ((first_name, username), rendered MarkdownV2 mention)}
+_mention_cache = TTLCache(maxsize=MENTION_CACHE_CHATS, ttl=MENTION_CACHE_TTL)
+
+
+def cache_mention(chat_id: int, user_id: int, username: str = None, first_name: str = None) -> str:
+    """Render a member's mention and store it in the chat's mention cache"""
+    mentions = _mention_cache.get(chat_id)
+    if mentions is None:
+        mentions = {}
+        _mention_cache.set(chat_id, mentions)
+    mention = get_user_mention(user_id, username, first_name)
+    mentions[user_id] = ((first_name, username), mention)
+    return mention
+
+
+def get_cached_mention(chat_id: int, user_id: int, username: str = None, first_name: str = None) -> str:
+    """get_user_mention served from the chat's mention cache
+
+    Entries are only used while the member's (first_name, username) is
+    unchanged, a renamed member is rendered again.
+    """
+    mentions = _mention_cache.get(chat_id)
+    if mentions is not None:
+        entry = mentions.get(user_id)
+        if entry is not None and entry[0] == (first_name, username):
+            return entry[1]
+    return cache_mention(chat_id, user_id, username, first_name)
+
+
+def forget_mentions(chat_id: int):
+    """Drop the cached mentions of a chat"""
+    _mention_cache.pop(chat_id)
 
 def get_user_link(user_id: int, first_name: str = None) -> str:
     """Create a clickable user link"""
@@ -194,48 +248,6 @@ def extract_time(time_str: str) -> int | None:
 
 # ==================== ROSE-STYLE FORMATTING ====================
 
-def apply_fillings(text: str, user, chat=None) -> str:
-    """Apply Rose-style fillings to text"""
-    if not text:
-        return text
-
-    first_name = user.first_name or "Kullanici"
-    last_name = user.last_name or ""
-    full_name = f"{first_name} {last_name}".strip()
-    username = f"@{user.username}" if user.username else first_name
-    chat_name = chat.title if chat else "Grup"
-
-    # Escape special characters for Markdown in the name used for mention
-    escaped_first_name = escape_markdown(first_name)
-    mention = f"[{escaped_first_name}](tg://user?id={user.id})"
-
-    replacements = {
-        '{first}': first_name,
-        '{last}': last_name,
-        '{fullname}': full_name,
-        '{username}': username,
-        '{mention}': mention,
-        '{id}': str(user.id),
-        '{chatname}': chat_name,
-    }
-
-    for key, value in replacements.items():
-        text = text.replace(key, value)
-
-    return text
-
-def parse_random_content(text: str) -> str:
-    """Parse Rose-style random content using %%% separator"""
-    if not text or '%%%' not in text:
-        return text
-
-    options = text.split('%%%')
-    options = [opt.strip() for opt in options if opt.strip()]
-
-    if options:
-        return random.choice(options)
-    return text
-
 def parse_buttons_raw(text: str) -> tuple[str, list]:
     """Parse buttons from text and return serializable data for database storage"""
     if not text:
@@ -287,23 +299,6 @@ def parse_buttons_raw(text: str) -> tuple[str, list]:
 
     return cleaned_text, buttons
 
-def parse_buttons(text: str) -> tuple[str, list]:
-    """Parse buttons from text and return InlineKeyboardButton objects"""
-    cleaned_text, raw_buttons = parse_buttons_raw(text)
-
-    if not raw_buttons:
-        return cleaned_text, []
-
-    # Convert raw button data to InlineKeyboardButton objects
-    buttons = []
-    for row in raw_buttons:
-        button_row = []
-        for btn_data in row:
-            button_row.append(InlineKeyboardButton(text=btn_data['text'], url=btn_data['url']))
-        buttons.append(button_row)
-
-    return cleaned_text, buttons
-
 def build_keyboard(buttons: list) -> InlineKeyboardMarkup | None:
     """Build InlineKeyboardMarkup from button list (supports both raw dicts and InlineKeyboardButton objects)"""
     if not buttons:
@@ -324,73 +319,48 @@ def build_keyboard(buttons: list) -> InlineKeyboardMarkup | None:
 
     return InlineKeyboardMarkup(inline_keyboard=keyboard_rows)
 
-def extract_buttons_from_text(text: str) -> tuple[str, InlineKeyboardMarkup | None]:
-    """Extract buttons and return cleaned text with keyboard"""
-    cleaned_text, url_buttons = parse_buttons(text)
-
-    if url_buttons:
-        return cleaned_text, build_keyboard(url_buttons)
-
-    return text, None
-
-def process_filter_response(text: str, user, chat=None) -> tuple[str, InlineKeyboardMarkup | None]:
-    """Process a filter response with all Rose-style features"""
-    if not text:
-        return "", None
-
-    # Step 1: Random content
-    text = parse_random_content(text)
-
-    # Step 2: Apply fillings
-    text = apply_fillings(text, user, chat)
-
-    # Step 3: Extract buttons
-    text, keyboard = extract_buttons_from_text(text)
-
-    return text.strip(), keyboard
-
 # ==================== COMMAND DETECTION ====================
 
-BOT_COMMANDS = [
-    'start', 'help', 'id', 'info', 'connect', 'disconnect', 'status',
-    'filter', 'filters', 'stop', 'stopall',
-    'kaydet', 'uyeler', 'üyeler', 'temizle', 'naber', 'etiket', 'durdur', 'herkes',
-    'ban', 'tban', 'dban', 'sban', 'unban',
-    'kick', 'dkick', 'skick',
-    'mute', 'tmute', 'dmute', 'smute', 'unmute',
-    'lock', 'unlock', 'del', 'purge', 'pin', 'unpin', 'admins',
-    'setadminonly', 'adminonly',
-    'approve', 'disapprove'
-]
+# Names of the commands handled by the bot's routers, filled once at startup
+# by register_bot_commands() from their Command(...) filters
+BOT_COMMANDS: frozenset = frozenset()
 
-def is_bot_command(text: str) -> bool:
-    """Check if message is a bot command"""
-    if not text or not text.startswith('/'):
-        return False
+# Leading "/command" or "/command@botname" token, nothing after it is scanned
+_COMMAND_RE = re.compile(r'/([^\s@]*)')
 
-    parts = text.split()
-    if not parts:
-        return False
 
-    cmd = parts[0][1:].lower()
+def collect_router_commands(router: Router) -> frozenset:
+    """Command names of every Command filter in a router tree"""
+    names = set()
+    for handler in router.message.handlers:
+        for filter_object in handler.filters or ():
+            command = filter_object.callback
+            if isinstance(command, Command):
+                # Regex commands can't be looked up in a set, they are skipped
+                names.update(name.lower() for name in command.commands if isinstance(name, str))
+    for sub_router in router.sub_routers:
+        names |= collect_router_commands(sub_router)
+    return frozenset(names)
 
-    if '@' in cmd:
-        cmd = cmd.split('@')[0]
 
-    return cmd in BOT_COMMANDS
+def register_bot_commands(router: Router):
+    """Build BOT_COMMANDS from the routers (call after all routers are included)"""
+    global BOT_COMMANDS
+    BOT_COMMANDS = collect_router_commands(router)
+
 
 def extract_command_name(text: str) -> str | None:
     """Extract command name from message"""
-    if not text or not text.startswith('/'):
+    if not text:
         return None
 
-    parts = text.split()
-    if not parts:
+    match = _COMMAND_RE.match(text)
+    if not match:
         return None
 
-    cmd = parts[0][1:].lower()
+    return match.group(1).lower()
 
-    if '@' in cmd:
-        cmd = cmd.split('@')[0]
 
-    return cmd
+def is_bot_command(text: str) -> bool:
+    """Check if message is a bot command"""
+    return extract_command_name(text) in BOT_COMMANDS
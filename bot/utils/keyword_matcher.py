@@ -0,0 +1,138 @@
+"""
+Keyword Matcher
+Multi-pattern matcher behind the in-memory filter index.
+
+- Regular keywords: Aho-Corasick automaton (keyword anywhere in the text)
+- prefix: keywords: trie walked from the start of the text
+- exact: keywords: hash lookup
+
+Every keyword carries a priority (its position in the filter list).
+match() returns the smallest matching priority, which keeps the old
+first-match-wins behaviour while the cost only depends on the text length.
+"""
+
+
+class KeywordMatcher:
+    """Compiled matcher for one chat's filter keywords"""
+
+    __slots__ = (
+        '_exact', '_prefix_children', '_prefix_priority',
+        '_goto', '_fail', '_best', '_best_contains',
+    )
+
+    def __init__(self, entries):
+        """Build the matcher
+
+        Args:
+            entries: Iterable of (kind, needle) tuples where kind is
+                'prefix', 'exact' or 'contains' and needle is lowercased.
+                The position of an entry is its priority.
+        """
+        self._exact = {}
+        self._prefix_children = [{}]
+        self._prefix_priority = [None]
+        self._goto = [{}]
+        self._fail = [0]
+        self._best = [None]
+        self._best_contains = None
+
+        for priority, (kind, needle) in enumerate(entries):
+            if kind == 'exact':
+                # First filter wins for duplicated exact keywords
+                self._exact.setdefault(needle, priority)
+            elif kind == 'prefix':
+                self._add_prefix(needle, priority)
+            else:
+                self._add_contains(needle, priority)
+                if self._best_contains is None:
+                    self._best_contains = priority
+
+        self._build_fail_links()
+
+    # ---------- building ----------
+
+    def _add_prefix(self, needle: str, priority: int):
+        node = 0
+        for char in needle:
+            nxt = self._prefix_children[node].get(char)
+            if nxt is None:
+                nxt = len(self._prefix_children)
+                self._prefix_children.append({})
+                self._prefix_priority.append(None)
+                self._prefix_children[node][char] = nxt
+            node = nxt
+        if self._prefix_priority[node] is None:
+            self._prefix_priority[node] = priority
+
+    def _add_contains(self, needle: str, priority: int):
+        node = 0
+        for char in needle:
+            nxt = self._goto[node].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._best.append(None)
+                self._goto[node][char] = nxt
+            node = nxt
+        if self._best[node] is None:
+            self._best[node] = priority
+
+    def _build_fail_links(self):
+        """Breadth-first pass computing failure links and, per state,
+        the best priority among all keywords ending there"""
+        goto, fail, best = self._goto, self._fail, self._best
+        queue = list(goto[0].values())
+        for node in queue:
+            for char, child in goto[node].items():
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                target = goto[state].get(char, 0)
+                fail[child] = target if target != child else 0
+                inherited = best[fail[child]]
+                if inherited is not None and (best[child] is None or inherited < best[child]):
+                    best[child] = inherited
+                queue.append(child)
+
+    # ---------- matching ----------
+
+    def match(self, text: str) -> int | None:
+        """Return the priority of the first filter matching ``text`` (already lowercased)"""
+        result = self._exact.get(text)
+
+        # prefix: walk the trie along the text
+        children, priorities = self._prefix_children, self._prefix_priority
+        node = 0
+        found = priorities[0]
+        if found is not None and (result is None or found < result):
+            result = found
+        for char in text:
+            node = children[node].get(char)
+            if node is None:
+                break
+            found = priorities[node]
+            if found is not None and (result is None or found < result):
+                result = found
+
+        # Regular keywords: single Aho-Corasick pass over the text
+        if self._best_contains is None:
+            return result
+        if result is not None and result < self._best_contains:
+            return result
+
+        goto, fail, best = self._goto, self._fail, self._best
+        state = 0
+        found = best[0]
+        if found is not None and (result is None or found < result):
+            result = found
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            found = best[state]
+            if found is not None and (result is None or found < result):
+                result = found
+                if result == self._best_contains:
+                    break
+        return result
@@ -0,0 +1,36 @@
+"""
+Markdown Escaping
+Single-pass escaping for Telegram's MarkdownV2 and legacy Markdown modes.
+
+Both escapers use precomputed str.translate tables, so every character of
+the text is visited once; the backslash is just another entry in the
+table and can't be double-escaped.
+"""
+
+# Characters that must be escaped in MarkdownV2 text
+MARKDOWN_V2_SPECIAL = '\\_*[]()~`>#+-=|{}.!'
+
+# Characters escaped for legacy Markdown (ParseMode.MARKDOWN)
+MARKDOWN_SPECIAL = '_*[]()~`'
+
+_MARKDOWN_V2_TABLE = str.maketrans({char: '\\' + char for char in MARKDOWN_V2_SPECIAL})
+_MARKDOWN_TABLE = str.maketrans({char: '\\' + char for char in MARKDOWN_SPECIAL})
+
+
+def escape_markdown_v2(text: str) -> str:
+    """Escape special characters for MarkdownV2 parse mode"""
+    if not text:
+        return text
+    return text.translate(_MARKDOWN_V2_TABLE)
+
+
+def escape_markdown(text: str) -> str:
+    """Escape special characters for Markdown parse mode (not V2)"""
+    if not text:
+        return text
+    return text.translate(_MARKDOWN_TABLE)
+
+
+def mention_markdown_v2(user_id: int, name: str) -> str:
+    """MarkdownV2 inline mention, notifies the user when sent"""
+    return f"[{name.translate(_MARKDOWN_V2_TABLE)}](tg://user?id={user_id})"
@@ -0,0 +1,135 @@
+"""
+Purge Engine
+Deletes large ranges of messages with deleteMessages.
+
+- Message IDs are sent in batches of 100 (the Bot API maximum), several
+  batches at a time, paced by the outbound rate limiter's per-chat delete
+  bucket as bulk traffic (a moderator's single deletes go first); flood
+  waits are retried there too
+- A batch rejected by Telegram is split in half until the messages that
+  can't be deleted are isolated, instead of falling back to one request
+  per message
+- Progress is reported periodically and a running purge can be cancelled
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+
+from bot.utils.rate_limiter import bulk_traffic
+
+logger = logging.getLogger(__name__)
+
+PURGE_BATCH_SIZE = 100        # deleteMessages limit
+PURGE_CONCURRENCY = 4         # batches in flight at once
+PURGE_PROGRESS_INTERVAL = 3   # seconds between progress reports
+
+
+class PurgeJob:
+    """State of one running purge"""
+
+    def __init__(self, chat_id: int, message_ids: list, started_by: int = None):
+        self.chat_id = chat_id
+        self.message_ids = message_ids
+        self.started_by = started_by
+        self.deleted = 0
+        self.failed = 0
+        self._cancelled = asyncio.Event()
+
+    @property
+    def total(self) -> int:
+        return len(self.message_ids)
+
+    @property
+    def done(self) -> int:
+        return self.deleted + self.failed
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+
+
+# chat_id -> running PurgeJob, one purge per chat
+_active_purges: dict[int, PurgeJob] = {}
+
+
+def get_active_purge(chat_id: int) -> PurgeJob | None:
+    return _active_purges.get(chat_id)
+
+
+def claim_purge(job: PurgeJob) -> bool:
+    """Register the job as the chat's purge, False if another one is running"""
+    return _active_purges.setdefault(job.chat_id, job) is job
+
+
+def cancel_purge(chat_id: int) -> bool:
+    """Cancel the chat's running purge, returns False if there is none"""
+    job = _active_purges.get(chat_id)
+    if job is None:
+        return False
+    job.cancel()
+    return True
+
+
+async def _delete_batch(bot: Bot, job: PurgeJob, batch: list):
+    """Delete a batch, bisecting it when Telegram rejects it"""
+    if job.cancelled:
+        return
+    try:
+        await bot.delete_messages(job.chat_id, batch)
+        job.deleted += len(batch)
+    except TelegramBadRequest:
+        if len(batch) == 1:
+            job.failed += 1
+            return
+        middle = len(batch) // 2
+        await _delete_batch(bot, job, batch[:middle])
+        await _delete_batch(bot, job, batch[middle:])
+    except Exception as e:
+        logger.warning(f"Toplu silme hatasi (chat {job.chat_id}): {e}")
+        job.failed += len(batch)
+
+
+async def run_purge(
+    bot: Bot,
+    job: PurgeJob,
+    on_progress: Callable[[PurgeJob], Awaitable[None]] | None = None
+) -> PurgeJob:
+    """Delete every message of the job, returns it once finished or cancelled"""
+    if not claim_purge(job):
+        raise RuntimeError(f"Purge already running in chat {job.chat_id}")
+
+    batches = iter([
+        job.message_ids[i:i + PURGE_BATCH_SIZE]
+        for i in range(0, len(job.message_ids), PURGE_BATCH_SIZE)
+    ])
+
+    async def worker():
+        with bulk_traffic():
+            for batch in batches:
+                if job.cancelled:
+                    return
+                await _delete_batch(bot, job, batch)
+
+    async def reporter():
+        while True:
+            await asyncio.sleep(PURGE_PROGRESS_INTERVAL)
+            try:
+                await on_progress(job)
+            except Exception:
+                pass
+
+    progress_task = asyncio.create_task(reporter()) if on_progress else None
+    try:
+        await asyncio.gather(*(worker() for _ in range(PURGE_CONCURRENCY)))
+    finally:
+        if progress_task:
+            progress_task.cancel()
+        _active_purges.pop(job.chat_id, None)
+    return job
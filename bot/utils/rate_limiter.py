@@ -0,0 +1,154 @@
+"""
+Outbound Rate Limiter
+Request middleware pacing every Bot API call the bot makes.
+
+- Token buckets per chat (Telegram: ~20 messages/minute in a group,
+  ~1 message/second in a private chat) and for the whole bot (~30/second)
+- Deletions have their own per-chat bucket, they don't count against the
+  message limits but bulk deletes (purge) still get flood-waited
+- Interactive replies go before bulk traffic (tagging) on the same bucket
+- TelegramRetryAfter is retried automatically after the requested delay
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from aiogram import methods
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+from bot.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Telegram limits
+GLOBAL_RATE = 30.0          # messages per second for the whole bot
+GLOBAL_BURST = 30
+GROUP_RATE = 20 / 60        # messages per second in one group
+GROUP_BURST = 5
+PRIVATE_RATE = 1.0          # messages per second in one private chat
+PRIVATE_BURST = 1
+DELETE_RATE = 3.0           # deleteMessage(s) requests per second in one chat
+DELETE_BURST = 4
+
+# How many times a request is retried after TelegramRetryAfter
+MAX_RETRIES = 3
+
+# Methods that post a message into a chat and count against the limits
+SEND_METHODS = (
+    methods.SendMessage, methods.SendPhoto, methods.SendAnimation, methods.SendVideo,
+    methods.SendDocument, methods.SendAudio, methods.SendVoice, methods.SendVideoNote,
+    methods.SendSticker, methods.SendMediaGroup, methods.SendPoll, methods.SendDice,
+    methods.SendContact, methods.SendLocation, methods.SendVenue,
+    methods.CopyMessage, methods.CopyMessages, methods.ForwardMessage, methods.ForwardMessages,
+)
+
+# Methods paced by the per-chat delete bucket
+DELETE_METHODS = (methods.DeleteMessage, methods.DeleteMessages)
+
+# True while the current task sends bulk traffic (see bulk_traffic)
+_bulk: ContextVar[bool] = ContextVar("bulk_traffic", default=False)
+
+
+@contextmanager
+def bulk_traffic():
+    """Mark requests made inside the block as low-priority bulk traffic"""
+    token = _bulk.set(True)
+    try:
+        yield
+    finally:
+        _bulk.reset(token)
+
+
+class TokenBucket:
+    """Token bucket where interactive callers are served before bulk ones"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._interactive_waiting = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def drain(self):
+        """Empty the bucket (after Telegram asked us to slow down)"""
+        self._refill()
+        self.tokens = 0.0
+
+    async def acquire(self, bulk: bool = False):
+        """Wait until a token is available and take it"""
+        if not bulk:
+            self._interactive_waiting += 1
+        try:
+            while True:
+                self._refill()
+                if self.tokens >= 1 and (not bulk or not self._interactive_waiting):
+                    self.tokens -= 1
+                    return
+                missing = max(1 - self.tokens, 0.0) or 1.0
+                await asyncio.sleep(missing / self.rate)
+        finally:
+            if not bulk:
+                self._interactive_waiting -= 1
+
+
+class RateLimitMiddleware(BaseRequestMiddleware):
+    """Paces outgoing messages and retries flood-wait errors"""
+
+    def __init__(self):
+        self.global_bucket = TokenBucket(GLOBAL_RATE, GLOBAL_BURST)
+        # chat_id -> TokenBucket, idle chats are forgotten
+        self.chat_buckets = TTLCache(maxsize=10000, ttl=600)
+        self.delete_buckets = TTLCache(maxsize=10000, ttl=600)
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if isinstance(chat_id, int) and chat_id > 0:
+                bucket = TokenBucket(PRIVATE_RATE, PRIVATE_BURST)
+            else:
+                bucket = TokenBucket(GROUP_RATE, GROUP_BURST)
+        # Re-set on every use so active chats never expire
+        self.chat_buckets.set(chat_id, bucket)
+        return bucket
+
+    def _delete_bucket(self, chat_id) -> TokenBucket:
+        bucket = self.delete_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(DELETE_RATE, DELETE_BURST)
+        self.delete_buckets.set(chat_id, bucket)
+        return bucket
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        limited = isinstance(method, SEND_METHODS) and chat_id is not None
+        deleting = isinstance(method, DELETE_METHODS) and chat_id is not None
+        bulk = _bulk.get()
+
+        attempt = 0
+        while True:
+            if limited:
+                chat_bucket = self._chat_bucket(chat_id)
+                await chat_bucket.acquire(bulk)
+                await self.global_bucket.acquire(bulk)
+            elif deleting:
+                chat_bucket = self._delete_bucket(chat_id)
+                await chat_bucket.acquire(bulk)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                attempt += 1
+                if attempt > MAX_RETRIES:
+                    raise
+                logger.warning(f"Flood wait {e.retry_after}s ({type(method).__name__}, chat {chat_id})")
+                if limited or deleting:
+                    chat_bucket.drain()
+                await asyncio.sleep(e.retry_after)
@@ -0,0 +1,154 @@
+"""
+Response Templates
+Compiles Rose-style response text once and renders it with a single join.
+
+- %%% random options are split at compile time
+- [text](url) buttons are extracted per option, before fillings are
+  applied, so a {mention} in the text stays inline text
+- {first}, {mention}, ... fillings become (literal, filling_name) tokens, in
+  the text as well as in button labels and URLs
+- Keyboards without fillings are built once; the others per rendered hit
+
+Compiled templates are immutable and cached by their source text.
+"""
+
+import random
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+from bot.utils.helpers import build_keyboard, parse_buttons_raw
+from bot.utils.markdown import escape_markdown
+
+FILLING_RE = re.compile(r'\{(first|last|fullname|username|mention|id|chatname)\}')
+
+TEMPLATE_CACHE_SIZE = 2048
+
+
+def _first_name(user) -> str:
+    return user.first_name or "Kullanici"
+
+
+# filling name -> value for a (user, chat) pair
+FILLINGS = {
+    'first': lambda user, chat: _first_name(user),
+    'last': lambda user, chat: user.last_name or "",
+    'fullname': lambda user, chat: f"{_first_name(user)} {user.last_name or ''}".strip(),
+    'username': lambda user, chat: f"@{user.username}" if user.username else _first_name(user),
+    # Escape special characters for Markdown in the name used for mention
+    'mention': lambda user, chat: f"[{escape_markdown(_first_name(user))}](tg://user?id={user.id})",
+    'id': lambda user, chat: str(user.id),
+    'chatname': lambda user, chat: chat.title if chat else "Grup",
+}
+
+
+def filling_values(user, chat=None, names=FILLINGS) -> dict:
+    """Values of the given fillings (all of them by default) for a user/chat pair"""
+    return {name: FILLINGS[name](user, chat) for name in names}
+
+
+def _render_tokens(tokens: tuple, values: dict | None) -> str:
+    if len(tokens) == 1:
+        return tokens[0][0]
+    return "".join([literal + values[name] if name else literal for literal, name in tokens])
+
+
+@dataclass(frozen=True, slots=True)
+class KeyboardTemplate:
+    """Buttons of a reply, prebuilt unless a label or URL uses fillings"""
+    markup: InlineKeyboardMarkup | None
+    # Rows of (text_tokens, url_tokens), only kept when there are fillings
+    rows: tuple | None = None
+    fillings: frozenset = frozenset()
+
+    def render(self, values: dict | None) -> InlineKeyboardMarkup:
+        if self.rows is None:
+            return self.markup
+        return InlineKeyboardMarkup(inline_keyboard=[
+            [
+                InlineKeyboardButton(text=_render_tokens(text, values), url=_render_tokens(url, values))
+                for text, url in row
+            ]
+            for row in self.rows
+        ])
+
+
+@dataclass(frozen=True, slots=True)
+class Template:
+    """Tokenized text plus the buttons that were written inside it"""
+    tokens: tuple
+    keyboard: KeyboardTemplate | None = None
+    # Names of the fillings used by this template (text and buttons)
+    fillings: frozenset = frozenset()
+
+    def render(self, values: dict | None) -> str:
+        return _render_tokens(self.tokens, values)
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledResponse:
+    """All %%% options of a response"""
+    options: tuple
+
+    @property
+    def fillings(self) -> frozenset:
+        return frozenset().union(*(option.fillings for option in self.options))
+
+    def choose(self) -> Template:
+        """Pick one of the random options"""
+        if len(self.options) == 1:
+            return self.options[0]
+        return random.choice(self.options)
+
+
+def _tokenize(text: str) -> tuple:
+    """Split text into (literal, filling_name) pairs; the last name is None"""
+    tokens = []
+    position = 0
+    for match in FILLING_RE.finditer(text):
+        tokens.append((text[position:match.start()], match.group(1)))
+        position = match.end()
+    tokens.append((text[position:], None))
+    return tuple(tokens)
+
+
+def _filling_names(tokens: tuple) -> frozenset:
+    return frozenset(name for _, name in tokens if name)
+
+
+def compile_keyboard(buttons: list) -> KeyboardTemplate | None:
+    """Compile stored/parsed buttons ([[{'text', 'url'}, ...], ...])"""
+    if not buttons:
+        return None
+
+    rows = tuple(
+        tuple((_tokenize(btn['text']), _tokenize(btn['url'])) for btn in row)
+        for row in buttons
+    )
+    fillings = frozenset().union(*(
+        _filling_names(text) | _filling_names(url) for row in rows for text, url in row
+    ))
+    if not fillings:
+        return KeyboardTemplate(build_keyboard(buttons))
+    return KeyboardTemplate(None, rows, fillings)
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def compile_response(text: str) -> CompiledResponse:
+    """Compile a filter response: random options, buttons and fillings"""
+    options = [text]
+    if '%%%' in text:
+        options = [opt.strip() for opt in text.split('%%%') if opt.strip()] or [text]
+
+    compiled = []
+    for option in options:
+        cleaned, buttons = parse_buttons_raw(option)
+        if not buttons:
+            cleaned = option
+        tokens = _tokenize(cleaned.strip())
+        keyboard = compile_keyboard(buttons)
+        fillings = _filling_names(tokens) | (keyboard.fillings if keyboard else frozenset())
+        compiled.append(Template(tokens, keyboard, fillings))
+    return CompiledResponse(tuple(compiled))
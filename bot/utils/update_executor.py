@@ -0,0 +1,142 @@
+"""
+Update Executor
+Runs incoming updates on a bounded pool of workers.
+
+- Updates of one chat are handled one at a time, in arrival order
+- Different chats are handled concurrently; a worker takes one update of a
+  chat and then moves the chat to the back of the line, so a busy group
+  can't monopolize the workers
+- Each chat may only have a limited number of waiting updates, the rest
+  is dropped
+- submit() waits while too many updates are pending in total; with
+  start_polling(handle_as_tasks=False) that pauses getUpdates (backpressure)
+- stop() refuses new updates and lets the queued ones finish first: their
+  getUpdates offset is already confirmed, Telegram won't send them again
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+from aiogram.types import TelegramObject
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateExecutor:
+    """Per-chat ordered executor with a fixed number of workers"""
+
+    def __init__(self, workers: int = 16, chat_queue_limit: int = 100, max_pending: int = 1000):
+        self.workers = workers
+        self.chat_queue_limit = chat_queue_limit
+        # key -> deque of waiting jobs; a key is present while it is waiting
+        # in _ready or being handled by a worker
+        self._queues: dict[Any, deque] = {}
+        self._ready: asyncio.Queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(max_pending)
+        self._tasks: list[asyncio.Task] = []
+        self._closed = False
+        # Set while no update is queued or running
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def start(self):
+        """Start the worker tasks"""
+        self._closed = False
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 20):
+        """Stop accepting updates, wait up to timeout for the queued ones, then cancel the workers"""
+        self._closed = True
+        if self._queues:
+            pending = sum(len(queue) for queue in self._queues.values())
+            logger.info(f"Kapanmadan once {pending} bekleyen guncelleme isleniyor...")
+            try:
+                await asyncio.wait_for(self._idle.wait(), timeout)
+            except asyncio.TimeoutError:
+                pending = sum(len(queue) for queue in self._queues.values())
+                logger.warning(f"Kapanma zaman asimi - {pending} guncelleme islenmeden atlandi")
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queues.clear()
+        self._idle.set()
+
+    def _is_full(self, key) -> bool:
+        queue = self._queues.get(key)
+        return queue is not None and len(queue) >= self.chat_queue_limit
+
+    async def submit(self, key, job: Callable[[], Awaitable[Any]]) -> bool:
+        """Queue a job behind the other jobs of the same key
+
+        Returns False if the key's queue is full or the executor is
+        stopping, and the job was dropped.
+        """
+        if self._closed:
+            logger.warning(f"Bot kapaniyor, guncelleme atlandi (chat {key})")
+            return False
+
+        if self._is_full(key):
+            logger.warning(f"Guncelleme kuyrugu dolu, guncelleme atlandi (chat {key})")
+            return False
+
+        # Backpressure: wait for a free slot
+        await self._slots.acquire()
+
+        # The queue may have filled up while we waited
+        if self._is_full(key):
+            self._slots.release()
+            logger.warning(f"Guncelleme kuyrugu dolu, guncelleme atlandi (chat {key})")
+            return False
+
+        queue = self._queues.get(key)
+        self._idle.clear()
+        if queue is None:
+            self._queues[key] = deque((job,))
+            self._ready.put_nowait(key)
+        else:
+            queue.append(job)
+        return True
+
+    async def _worker(self):
+        while True:
+            key = await self._ready.get()
+            queue = self._queues[key]
+            job = queue.popleft()
+            try:
+                await job()
+            except Exception:
+                logger.exception(f"Guncelleme islenirken hata (chat {key})")
+            finally:
+                self._slots.release()
+                # Next update of this chat goes to the back of the line
+                if queue:
+                    self._ready.put_nowait(key)
+                else:
+                    del self._queues[key]
+                    if not self._queues:
+                        self._idle.set()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any]
+    ) -> Any:
+        """Dispatcher-level outer middleware handing the update to the executor"""
+        chat = data.get("event_chat")
+        user = data.get("event_from_user")
+        if chat is not None:
+            key = chat.id
+        elif user is not None:
+            key = ("user", user.id)
+        else:
+            # Nothing to order against
+            key = object()
+
+        await self.submit(key, lambda: handler(event, data))
+        return None